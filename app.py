@@ -12,25 +12,191 @@
 Geometry Output App for Houdini
 """
 
+import json
+import time
+
 import sgtk
 
 
 class GeometryOutputNode(sgtk.platform.Application):
     def init_app(self):
-        module = self.import_module("tk_houdini_geometrynode")
-        self.handler = module.ToolkitGeometryNodeHandler(self)
+        # The handler, and everything it imports, is only loaded once a
+        # geometry node or one of the app methods needs it. Batch sessions
+        # that never touch a geometry node don't pay for it.
+        self._handler = None
+        self._startup_timings = {'handler_load_ms': None}
+
+    def destroy_app(self):
+        if self._handler:
+            self._handler.destroy()
+
+    @property
+    def handler(self):
+        """
+        The ToolkitGeometryNodeHandler, imported and created on first use.
+        """
+        if self._handler is None:
+            start = time.time()
+            module = self.import_module("tk_houdini_geometrynode")
+            self._handler = module.ToolkitGeometryNodeHandler(self)
+            load_ms = (time.time() - start) * 1000.0
+            self._startup_timings['handler_load_ms'] = load_ms
+            self.log_debug("Loaded geometry node handler in %.2f ms" % load_ms)
+        return self._handler
+
+    def register_node(self, node):
+        """
+        Registers a sgtk node created while another instance of the app
+        handled OnCreated. Nothing to do until the handler is loaded, it
+        finds the node when it scans the scene.
+        """
+        if self._handler is not None:
+            self._handler.register_node(node)
+
+    def get_startup_timings(self):
+        """
+        Return the time spent loading the handler on first use (None if not
+        loaded yet), in milliseconds.
+        """
+        return dict(self._startup_timings)
+
+    def dump_instrumentation(self):
+        """
+        Log the timings of the node callbacks recorded since instrumentation
+        was enabled (see the enable_instrumentation setting) and return them.
+        """
+        report = self.handler.get_instrumentation_report()
+        if report is None:
+            self.log_info("Instrumentation is disabled.")
+            return None
+
+        for name, stats in sorted(report.items()):
+            self.log_info(
+                "{0}: {1} calls, {2:.2f} ms total, {3:.2f} ms mean, "
+                "{4:.2f} ms p95".format(name, stats['count'],
+                                        stats['total_ms'], stats['mean_ms'],
+                                        stats['p95_ms'] or 0.0))
+            for node_path, node_stats in sorted(stats['nodes'].items()):
+                self.log_debug("    {0}: {1} calls, {2:.2f} ms".format(
+                    node_path, node_stats['count'], node_stats['total_ms']))
+        return report
+
+    def compute_output_paths(self):
+        """
+        Compute the output paths of all Shotgun Geometry nodes found in the
+        current Script in one pass. Returns a dictionary of node path ->
+        output path.
+        """
+        return self.handler.compute_paths()
+
+    def check_output_collisions(self):
+        """
+        Check that no two Shotgun Geometry nodes found in the current Script
+        write to the same output path, for example before submitting a
+        render. Collisions are logged as warnings and returned.
+        """
+        collisions = self.handler.find_output_collisions()
+        for collision in collisions:
+            self.log_warning(
+                "{0} write to the same output {1} ({2} overlapping "
+                "frames).".format(', '.join(collision['nodes']),
+                                   collision['path'],
+                                   len(collision['overlapping_frames'])))
+        return collisions
+
+    def write_cache_manifests(self):
+        """
+        Write the cache manifests of all Shotgun Geometry nodes found in the
+        current Script. Returns a dictionary of node path -> manifest path.
+        """
+        manifests = {}
+        for node in self.handler.get_nodes():
+            try:
+                manifests[node.path()] = self.handler.write_manifest(node)
+            except Exception as err:
+                self.log_warning('{0}: {1}'.format(node.name(), err))
+        return manifests
+
+    def report_disk_usage(self, path=None, keep_versions=None):
+        """
+        Report the disk usage of all versions of the outputs of all Shotgun
+        Geometry nodes found in the current Script. The report is written to
+        path, if given, as csv if it ends with .csv and as json otherwise.
+
+        With keep_versions, also list the versions that would be deleted to
+        keep only that many versions per node. Nothing is deleted.
+
+        Returns a dictionary with the report and the prune dry run.
+        """
+        report = self.handler.get_disk_usage()
+        if path:
+            self.handler.write_disk_usage_report(report, path)
+
+        candidates = None
+        if keep_versions is not None:
+            candidates = self.handler.get_prune_candidates(report,
+                                                           keep_versions)
+            self.log_info("{0} old versions, {1} bytes could be pruned.".format(
+                len(candidates),
+                sum(c['total_bytes'] for c in candidates)))
+
+        return {'nodes': report, 'prune_dry_run': candidates}
+
+    def render_dirty_frames(self):
+        """
+        Re-render only the missing and stale frames of all Shotgun Geometry
+        nodes found in the current Script. Returns a dictionary of node
+        path -> rendered (start, end, step) chunks.
+        """
+        rendered = {}
+        for node in self.handler.get_nodes():
+            try:
+                rendered[node.path()] = \
+                    self.handler.render_dirty_frames(node)
+            except Exception as err:
+                self.log_warning('{0}: {1}'.format(node.name(), err))
+        return rendered
+
+    def plan_farm_jobs(self, path=None, target_seconds=600):
+        """
+        Plan the farm submission of all Shotgun Geometry ROP nodes found in
+        the current Script as frame chunks of about target_seconds each.
+        The plan is written as json to path, if given, and returned.
+        """
+        plan = self.handler.plan_farm_jobs(target_seconds=target_seconds)
+        if path:
+            with open(path, 'w') as plan_file:
+                json.dump(plan, plan_file, indent=2, sort_keys=True)
+        return plan
+
+    def create_file_nodes(self, selected_only=False, packed=False):
+        """
+        Create file nodes reading the outputs of all Shotgun Geometry nodes
+        found in the current Script, or of the selected ones only. With
+        packed, the files are loaded as packed disk primitives.
+
+        Returns a report of the created readers and the failed nodes.
+        """
+        nodes = None
+        if selected_only:
+            nodes = self.handler.get_selected_nodes()
+        return self.handler.create_file_nodes(nodes, packed)
 
     def convert_to_geometry_nodes(self):
         """
         Convert all Shotgun Geometry nodes found in the current Script to regular
         Geometry nodes. Additional toolkit information will be stored in
         user data named 'tk_*'
+
+        Returns a report of the converted, skipped and failed nodes.
         """
-        self.handler.convert_sg_to_geometry_nodes()
+        return self.handler.convert_sg_to_geometry_nodes()
 
     def convert_from_geometry_nodes(self):
         """
         Convert all regular Geometry nodes that have previously been converted
         from Shotgun Geometry nodes, back into Shotgun Geometry nodes.
+
+        Returns a report of the converted, skipped and failed nodes.
         """
-        self.handler.convert_geometry_to_sg_nodes()
+        return self.handler.convert_geometry_to_sg_nodes()
@@ -0,0 +1,144 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+"""
+Times the ToolkitGeometryNodeHandler hot paths headless, against the mock
+hou and sgtk modules, for a range of scene sizes. Results are written as
+json so they can be compared between revisions.
+
+Usage: python benchmarks/bench_handler.py [--sizes 10 100 1000 10000]
+                                          [--frames 1000] [--output FILE]
+"""
+
+import argparse
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import harness
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+
+
+def timed(results, name, count, func, *args, **kwargs):
+    """
+    Runs func and stores its total and per item duration under name.
+    """
+    start = time.time()
+    value = func(*args, **kwargs)
+    total = time.time() - start
+    results[name] = {'total_s': total,
+                     'per_item_us': total / max(count, 1) * 1e6,
+                     'items': count}
+    return value
+
+
+def compute_each(handler, nodes):
+    for node in nodes:
+        handler.compute_path(node)
+
+
+def menu_each(handler, nodes):
+    hou = harness.hou
+    for node in nodes:
+        hou.setPwd(node)
+        handler.create_output_path_menu()
+    hou.setPwd(None)
+
+
+def repeat(count, func, *args):
+    for _ in range(count):
+        func(*args)
+
+
+def codec_round_trip(user_data, count):
+    data = [{'node': '/obj/geo1/null%d' % i, 'input': 0}
+            for i in range(count)]
+    user_data.decode(user_data.encode(data))
+
+
+def run_size(root, size, frames):
+    hou = harness.hou
+    app, handler = harness.make_handler(root)
+    nodes = timed({}, 'build', size, harness.build_scene, size)
+    results = {}
+
+    # invalidates the output path cache without touching the scene
+    hou.hipFile.save()
+    timed(results, 'compute_path_cold', size, compute_each, handler, nodes)
+    timed(results, 'compute_path_warm', size, compute_each, handler, nodes)
+    timed(results, 'create_output_path_menu', size, menu_each, handler,
+          nodes)
+    hou.hipFile.save()
+    timed(results, 'compute_paths_cold', size, handler.compute_paths)
+    timed(results, 'find_output_collisions', size,
+          handler.find_output_collisions)
+    timed(results, 'get_nodes', 100, repeat, 100, handler.get_nodes)
+
+    frame_node = nodes[0]
+    harness.write_frames(handler, frame_node, frames)
+    timed(results, 'get_files_on_disk_cold', frames,
+          handler.get_files_on_disk, frame_node)
+    timed(results, 'get_files_on_disk_warm', frames * 10, repeat, 10,
+          handler.get_files_on_disk, frame_node)
+
+    import tk_houdini_geometrynode.user_data as user_data
+    timed(results, 'user_data_round_trip', size, codec_round_trip,
+          user_data, size)
+
+    report = timed(results, 'convert_sg_to_geometry_nodes', size,
+                   handler.convert_sg_to_geometry_nodes)
+    results['convert_sg_to_geometry_nodes']['failed'] = len(report['failed'])
+    report = timed(results, 'convert_geometry_to_sg_nodes', size,
+                   handler.convert_geometry_to_sg_nodes)
+    results['convert_geometry_to_sg_nodes']['failed'] = len(report['failed'])
+
+    timed(results, 'create_file_nodes', size, handler.create_file_nodes,
+          None, True)
+
+    results['path_cache'] = handler.get_path_cache_stats()
+    handler.destroy()
+    return {'nodes': size, 'timings': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='number of sgtk nodes per scene')
+    parser.add_argument('--frames', type=int, default=1000,
+                        help='number of frames written for frame discovery')
+    parser.add_argument('--output', help='json file to write, default stdout')
+    args = parser.parse_args(argv)
+
+    harness.install()
+    results = []
+    for size in args.sizes:
+        root = tempfile.mkdtemp(prefix='tk_geometry_bench_')
+        try:
+            results.append(run_size(root, size, args.frames))
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+    report = {'benchmark': 'handler',
+              'python': platform.python_version(),
+              'results': results}
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+"""
+Compares parsing paths with validate followed by get_fields (two passes),
+with a single get_fields (match_fields) and with the memoizing
+TemplateMatcher, for the work file and the work cache templates of the
+mock sgtk.
+
+Usage: python benchmarks/bench_template_match.py [--paths 1 10 100 1000]
+                                                 [--repeat 10000]
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import timeit
+
+import harness
+
+DEFAULT_PATHS = [1, 10, 100, 1000]
+
+
+def two_pass(template, path):
+    if template.validate(path):
+        return template.get_fields(path)
+    return None
+
+
+def make_paths(templates, count):
+    """
+    Returns count work file paths and count cache paths, plus one of each
+    that doesn't match.
+    """
+    work_file = templates['work_file_template']
+    work_cache = templates['work_cache_template']
+    fields = dict(harness.CONTEXT_FIELDS)
+    work_files = []
+    caches = []
+    for index in range(count):
+        fields.update(version=index + 1, renderpass='node%d' % index,
+                      SEQ='FORMAT: $F')
+        work_files.append(work_file.apply_fields(fields))
+        caches.append(work_cache.apply_fields(fields))
+    work_files.append('/elsewhere/untitled.hip')
+    caches.append('/elsewhere/cache.$F4.bgeo.sc')
+    return {'work_file_template': work_files, 'work_cache_template': caches}
+
+
+def measure(parse, template, paths, repeat):
+    def run():
+        for path in paths:
+            parse(template, path)
+    number = max(1, repeat // len(paths))
+    best = min(timeit.repeat(run, number=number, repeat=3))
+    return best / (number * len(paths)) * 1e6
+
+
+def run(counts, repeat):
+    import tk_houdini_geometrynode.template_match as template_match
+
+    templates = harness.make_templates(tempfile.gettempdir())
+    results = []
+    for count in counts:
+        paths = make_paths(templates, count)
+        for name in ('work_file_template', 'work_cache_template'):
+            template = templates[name]
+            matcher = template_match.TemplateMatcher()
+            results.append({
+                'template': name,
+                'paths': count,
+                'two_pass_us': measure(two_pass, template, paths[name],
+                                       repeat),
+                'single_pass_us': measure(template_match.match_fields,
+                                          template, paths[name], repeat),
+                'memoized_us': measure(matcher.fields, template,
+                                       paths[name], repeat),
+                'memoized_hit_rate': float(matcher.hits) /
+                max(1, matcher.hits + matcher.misses)})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--paths', type=int, nargs='+',
+                        default=DEFAULT_PATHS,
+                        help='number of distinct paths parsed in turn')
+    parser.add_argument('--repeat', type=int, default=10000,
+                        help='number of parses per measurement')
+    args = parser.parse_args(argv)
+
+    harness.install()
+    json.dump({'benchmark': 'template_match',
+               'results': run(args.paths, args.repeat)},
+              sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
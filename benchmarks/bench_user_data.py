@@ -0,0 +1,74 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+"""
+Compares the legacy sgtk-01 (pickle) and the sgtk-02 (json) user data
+codecs: encode/decode throughput and payload size by number of stored
+output connections.
+
+Usage: python benchmarks/bench_user_data.py [counts ...]
+"""
+
+import base64
+import json
+import os
+import pickle
+import sys
+import timeit
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'python', 'tk_houdini_geometrynode'))
+
+import user_data  # noqa: E402
+
+DEFAULT_COUNTS = [1, 10, 100, 1000, 10000]
+
+
+def encode_v1(data):
+    """
+    The sgtk-01 writer as it shipped before sgtk-02.
+    """
+    payload = base64.b64encode(zlib.compress(pickle.dumps(data)))
+    return user_data.PREFIX_V1 + payload.decode('ascii')
+
+
+def make_connections(count):
+    return [{'node': '/obj/geo1/downstream_node_%d' % i, 'input': i % 4}
+            for i in range(count)]
+
+
+def measure(encode, data, repeat):
+    encoded = encode(data)
+    encode_time = min(timeit.repeat(lambda: encode(data),
+                                    number=repeat, repeat=3)) / repeat
+    decode_time = min(timeit.repeat(lambda: user_data.decode(encoded),
+                                    number=repeat, repeat=3)) / repeat
+    return {'size': len(encoded),
+            'encode_us': encode_time * 1e6,
+            'decode_us': decode_time * 1e6}
+
+
+def run(counts):
+    results = []
+    for count in counts:
+        data = make_connections(count)
+        repeat = max(1, 10000 // count)
+        results.append({'connections': count,
+                        'sgtk-01': measure(encode_v1, data, repeat),
+                        'sgtk-02': measure(user_data.encode, data, repeat)})
+    return results
+
+
+if __name__ == '__main__':
+    counts = [int(c) for c in sys.argv[1:]] or DEFAULT_COUNTS
+    json.dump({'benchmark': 'user_data', 'results': run(counts)},
+              sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
@@ -0,0 +1,205 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+"""
+Sets up the mock hou and sgtk modules, the app and synthetic scenes to run
+the handler headless.
+
+    import harness
+    harness.install()
+    app, handler = harness.make_handler(root)
+    harness.build_scene(handler, 100)
+"""
+
+import os
+import struct
+import sys
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PYTHON_DIR = os.path.join(BENCHMARKS_DIR, '..', 'python')
+
+WORK_FILE_DEFINITION = ("sequences/{Sequence}/{Shot}/work/houdini/"
+                        "{Shot}[_{name}]_v{version}.hip")
+WORK_CACHE_DEFINITION = ("sequences/{Sequence}/{Shot}/work/houdini/cache/"
+                         "{Shot}[_{name}]_v{version}/{renderpass}/"
+                         "{Shot}_{renderpass}_v{version}.{SEQ}.bgeo.sc")
+CONTEXT_FIELDS = {'Sequence': 'sq01', 'Shot': 'sh010'}
+PROFILE = ('tk-houdini-geometrynode', 'Geometry')
+
+hou = None
+sgtk = None
+
+
+def install():
+    """
+    Makes the mocks importable as hou and sgtk and the app package
+    importable as tk_houdini_geometrynode.
+    """
+    global hou, sgtk
+    if BENCHMARKS_DIR not in sys.path:
+        sys.path.insert(0, BENCHMARKS_DIR)
+    import mock_hou
+    import mock_sgtk
+    sys.modules['hou'] = mock_hou
+    sys.modules['sgtk'] = mock_sgtk
+    sys.modules['sgtk.platform'] = mock_sgtk.platform
+    if PYTHON_DIR not in sys.path:
+        sys.path.insert(0, PYTHON_DIR)
+    hou, sgtk = mock_hou, mock_sgtk
+
+
+def make_templates(root):
+    keys = {'Sequence': sgtk.StringKey('Sequence'),
+            'Shot': sgtk.StringKey('Shot'),
+            'name': sgtk.StringKey('name'),
+            'version': sgtk.IntegerKey('version', '03'),
+            'renderpass': sgtk.StringKey('renderpass'),
+            'SEQ': sgtk.SequenceKey('SEQ', '04')}
+    work_file = sgtk.TemplatePath(WORK_FILE_DEFINITION, keys, root,
+                                  'work_file_template')
+    work_cache = sgtk.TemplatePath(WORK_CACHE_DEFINITION, keys, root,
+                                   'work_cache_template')
+    return {'work_file_template': work_file,
+            'work_cache_template': work_cache,
+            'work_render_template': work_cache}
+
+
+def make_app(root):
+    settings = {'name': PROFILE[1], 'default_node_name': 'sgtk_geometry'}
+    app = sgtk.Application(make_templates(root), settings,
+                           sgtk.Context(CONTEXT_FIELDS), PROFILE[0])
+    sgtk.set_engine(sgtk.Engine({PROFILE[0]: app}))
+    return app
+
+
+def work_file_path(root, version=3):
+    return os.path.join(root, 'sequences', 'sq01', 'sh010', 'work',
+                        'houdini', 'sh010_v%03d.hip' % version)
+
+
+def define_node_types(handler):
+    """
+    Declares the node types the app works with. Menu and OnCreated scripts
+    of the sgtk types call into the given handler, like the OTLs do.
+    """
+    common = [
+        (hou.FolderSetParmTemplate('stdswitcher'), ('stdswitcher1',), (0,)),
+        (hou.IntParmTemplate('trange'), ('trange',), (1,)),
+        (hou.FloatParmTemplate('f', 3), ('f1', 'f2', 'f3'),
+         (1.0, 240.0, 1.0)),
+        (hou.ToggleParmTemplate('mkpath'), ('mkpath',), (1,)),
+        (hou.ToggleParmTemplate('initsim'), ('initsim',), (0,)),
+        (hou.StringParmTemplate('prerender'), ('prerender',), ('',)),
+        (hou.StringParmTemplate('postrender'), ('postrender',), ('',)),
+        (hou.StringParmTemplate('take'), ('take',), ('_current_',)),
+    ]
+
+    def output_path_menu(node):
+        return handler.create_output_path_menu()
+
+    sgtk_parms = [
+        (hou.IntParmTemplate('sopoutput'), ('sopoutput',), (0,),
+         output_path_menu),
+        (hou.IntParmTemplate('geometry_config', menu_items=list(PROFILE)),
+         ('geometry_config',), (0,)),
+        (hou.StringParmTemplate('geometry1_camera'), ('geometry1_camera',),
+         ('/obj/cam1',)),
+    ] + common
+    geometry_parms = [
+        (hou.StringParmTemplate('sopoutput'), ('sopoutput',),
+         ('$HIP/geo/$OS.$F4.bgeo.sc',)),
+    ] + common
+    soppath = [(hou.StringParmTemplate('soppath'), ('soppath',), ('',))]
+
+    sop = hou.sopNodeTypeCategory()
+    rop = hou.ropNodeTypeCategory()
+    obj = hou.objNodeTypeCategory()
+
+    execute = [(hou.ButtonParmTemplate('execute'), ('execute',), (0,))]
+    hou.define_type(sop, 'sgtk_geometry', sgtk_parms + execute,
+                    on_created=handler.set_default_node_name)
+    hou.define_type(rop, 'sgtk_geometry', sgtk_parms + soppath,
+                    max_inputs=4, on_created=handler.set_default_node_name)
+    hou.define_type(sop, 'rop_geometry', geometry_parms)
+    hou.define_type(rop, 'geometry', geometry_parms + soppath, max_inputs=4)
+    hou.define_type(sop, 'null')
+    hou.define_type(sop, 'file', [
+        (hou.StringParmTemplate('file'), ('file',), ('',)),
+        (hou.StringParmTemplate('loadtype'), ('loadtype',), ('full',)),
+    ])
+    hou.define_type(obj, 'geo', max_inputs=1, child_category=sop)
+    hou.define_type(obj, 'cam', [
+        (hou.IntParmTemplate('res', 2), ('resx', 'resy'), (1920, 1080)),
+    ])
+
+
+def make_handler(root):
+    """
+    Returns a new app and handler working in a fresh scene saved as a work
+    file below root.
+    """
+    app = make_app(root)
+    import tk_houdini_geometrynode
+    handler = tk_houdini_geometrynode.ToolkitGeometryNodeHandler(app)
+    define_node_types(handler)
+    hou.hipFile.clear()
+    hou.hipFile.setName(work_file_path(root))
+    return app, handler
+
+
+def build_scene(num_nodes, per_network=100, rop_every=5):
+    """
+    Creates num_nodes sgtk nodes. Every rop_every-th node is a ROP in /out,
+    the others are SOPs wired between a null and a null in geo networks of
+    per_network nodes.
+    """
+    obj = hou.node('/obj')
+    out = hou.node('/out')
+    obj.createNode('cam', 'cam1')
+
+    nodes = []
+    network = None
+    for index in range(num_nodes):
+        if index % rop_every == rop_every - 1:
+            rop = out.createNode('sgtk_geometry')
+            if nodes and nodes[-1].parent() == out:
+                rop.setInput(0, nodes[-1])
+            nodes.append(rop)
+            continue
+
+        if network is None or len(network.children()) >= per_network * 3:
+            network = obj.createNode('geo')
+        upstream = network.createNode('null')
+        sg_node = network.createNode('sgtk_geometry')
+        downstream = network.createNode('null')
+        sg_node.setInput(0, upstream)
+        downstream.setInput(0, sg_node)
+        nodes.append(sg_node)
+    return nodes
+
+
+def write_frames(handler, node, count, size=64):
+    """
+    Writes count frames of size bytes for the output path of node. Frames
+    of 16 bytes or more start with the Blosc chunk header of a .sc file.
+    """
+    header = b''
+    if size >= 16:
+        header = struct.pack('<BBBBIII', 2, 1, 1, 1, size - 16, size - 16,
+                             size)
+    pattern = handler.compute_path(node)
+    directory = os.path.dirname(pattern)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for frame in range(1, count + 1):
+        path = pattern.replace('$F4', '%04d' % frame)
+        with open(path, 'wb') as frame_file:
+            frame_file.write(header + b'\0' * (size - len(header)))
+    return pattern
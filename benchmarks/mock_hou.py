@@ -0,0 +1,753 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+"""
+In-memory stand-in for the parts of the hou module used by the app.
+
+Only meant to run the handler headless in plain CPython. It models nodes,
+parms and parm tuples, menus, user data, connections and event callbacks,
+not cooking.
+"""
+
+import contextlib
+import itertools
+
+
+################################################################################
+# Exceptions
+
+class Error(Exception):
+    pass
+
+
+class OperationFailed(Error):
+    pass
+
+
+class InvalidInput(Error):
+    pass
+
+
+class ObjectWasDeleted(Error):
+    pass
+
+
+################################################################################
+# Enums
+
+class _Enum(object):
+    def __init__(self, *names):
+        for name in names:
+            setattr(self, name, '%s' % name)
+
+
+hipFileEventType = _Enum('BeforeClear', 'AfterClear', 'BeforeLoad',
+                         'AfterLoad', 'BeforeMerge', 'AfterMerge',
+                         'BeforeSave', 'AfterSave')
+
+nodeEventType = _Enum('BeingDeleted', 'NameChanged', 'ParmTupleChanged',
+                      'ChildCreated', 'ChildDeleted', 'InputRewired')
+
+updateMode = _Enum('AutoUpdate', 'OnMouseUp', 'Manual')
+
+_update_mode = updateMode.AutoUpdate
+
+
+def updateModeSetting():
+    return _update_mode
+
+
+def setUpdateMode(mode):
+    global _update_mode
+    _update_mode = mode
+
+
+################################################################################
+# Parm templates
+
+class ParmTemplate(object):
+    def __init__(self, name, num_components=1, menu_items=None):
+        self._name = name
+        self._num_components = num_components
+        self._menu_items = menu_items
+
+    def name(self):
+        return self._name
+
+    def numComponents(self):
+        return self._num_components
+
+
+class StringParmTemplate(ParmTemplate):
+    pass
+
+
+class IntParmTemplate(ParmTemplate):
+    pass
+
+
+class FloatParmTemplate(ParmTemplate):
+    pass
+
+
+class ToggleParmTemplate(ParmTemplate):
+    pass
+
+
+class MenuParmTemplate(ParmTemplate):
+    pass
+
+
+class ButtonParmTemplate(ParmTemplate):
+    pass
+
+
+class FolderSetParmTemplate(ParmTemplate):
+    pass
+
+
+class Keyframe(object):
+    def __init__(self, value=0.0, time=0.0, expression=None):
+        self._value = value
+        self._time = time
+        self._expression = expression
+
+    def value(self):
+        return self._value
+
+    def time(self):
+        return self._time
+
+    def expression(self):
+        return self._expression
+
+
+################################################################################
+# Parms
+
+class Parm(object):
+    def __init__(self, parm_tuple, name, value):
+        self._tuple = parm_tuple
+        self._name = name
+        self._value = value
+        self._keyframes = []
+
+    def name(self):
+        return self._name
+
+    def node(self):
+        return self._tuple.node()
+
+    def tuple(self):
+        return self._tuple
+
+    def parmTemplate(self):
+        return self._tuple.parmTemplate()
+
+    def eval(self):
+        if self._keyframes:
+            return self._keyframes[0].value()
+        return self._value
+
+    def evalAsString(self):
+        return str(self.eval())
+
+    def unexpandedString(self):
+        return self._value
+
+    def rawValue(self):
+        return str(self._value)
+
+    def set(self, value):
+        self._value = value
+        self._keyframes = []
+        self._tuple._changed()
+
+    def keyframes(self):
+        return tuple(self._keyframes)
+
+    def setKeyframe(self, keyframe):
+        self._keyframes.append(keyframe)
+        self._tuple._changed()
+
+    def deleteAllKeyframes(self):
+        self._keyframes = []
+        self._tuple._changed()
+
+    def pressButton(self):
+        # buttons of the mock types only render, like execute
+        node = self.node()
+        node.rendered_ranges = getattr(node, 'rendered_ranges', [])
+        node.rendered_ranges.append(tuple(node.parmTuple('f').eval()))
+
+    def menuItems(self):
+        return self._tuple._menu()[0]
+
+    def menuLabels(self):
+        return self._tuple._menu()[1]
+
+
+class ParmTuple(object):
+    def __init__(self, node, template, names, values, menu_script=None):
+        self._node = node
+        self._template = template
+        self._menu_script = menu_script
+        self._parms = [Parm(self, name, value)
+                       for name, value in zip(names, values)]
+
+    def __iter__(self):
+        return iter(self._parms)
+
+    def __len__(self):
+        return len(self._parms)
+
+    def __getitem__(self, index):
+        return self._parms[index]
+
+    def name(self):
+        return self._template.name()
+
+    def node(self):
+        return self._node
+
+    def parmTemplate(self):
+        return self._template
+
+    def eval(self):
+        return tuple(p.eval() for p in self._parms)
+
+    def set(self, values):
+        for parm, value in zip(self._parms, values):
+            parm._value = value
+            parm._keyframes = []
+        self._changed()
+
+    def _menu(self):
+        if self._menu_script is not None:
+            global _pwd
+            previous, _pwd = _pwd, self._node
+            try:
+                menu = self._menu_script(self._node)
+            finally:
+                _pwd = previous
+        else:
+            menu = self._template._menu_items or []
+        return tuple(menu[0::2]), tuple(menu[1::2])
+
+    def _changed(self):
+        self._node._fire(nodeEventType.ParmTupleChanged, parm_tuple=self)
+
+
+################################################################################
+# Node types
+
+class NodeTypeCategory(object):
+    def __init__(self, name):
+        self._name = name
+        self._types = {}
+
+    def name(self):
+        return self._name
+
+    def nodeTypes(self):
+        return dict(self._types)
+
+
+class NodeType(object):
+    """
+    parms: List of (template, component names, default values) or
+           (template, component names, default values, menu script).
+    """
+
+    def __init__(self, category, name, parms=(), max_inputs=1,
+                 child_category=None, on_created=None):
+        self._category = category
+        self._name = name
+        self._parms = parms
+        self._max_inputs = max_inputs
+        self._child_category = child_category
+        self.on_created = on_created
+        category._types[name] = self
+
+    def name(self):
+        return self._name
+
+    def category(self):
+        return self._category
+
+    def instances(self):
+        return tuple(n for n in _nodes.values() if n._type is self)
+
+
+_categories = {}
+
+
+def _category(name):
+    if name not in _categories:
+        _categories[name] = NodeTypeCategory(name)
+    return _categories[name]
+
+
+def sopNodeTypeCategory():
+    return _category('Sop')
+
+
+def ropNodeTypeCategory():
+    return _category('Driver')
+
+
+def objNodeTypeCategory():
+    return _category('Object')
+
+
+def managerNodeTypeCategory():
+    return _category('Manager')
+
+
+def nodeType(category, name):
+    return category._types.get(name)
+
+
+def define_type(category, name, parms=(), **kwargs):
+    """
+    Declares a node type, replacing any previous definition.
+    """
+    return NodeType(category, name, parms, **kwargs)
+
+
+################################################################################
+# Nodes
+
+class NodeConnection(object):
+    def __init__(self, input_node, output_node, input_index):
+        self._input_node = input_node
+        self._output_node = output_node
+        self._input_index = input_index
+
+    def inputNode(self):
+        return self._input_node
+
+    def outputNode(self):
+        return self._output_node
+
+    def inputIndex(self):
+        return self._input_index
+
+
+_session_ids = itertools.count(1)
+_nodes = {}
+
+
+class Node(object):
+    def __init__(self, parent, node_type, name):
+        self._parent = parent
+        self._type = node_type
+        self._name = name
+        self._session_id = next(_session_ids)
+        self._children = {}
+        self._callbacks = []
+        self._user_data = {}
+        self._position = (0.0, 0.0)
+        self._color = (0.8, 0.8, 0.8)
+        self._inputs = [None] * (node_type._max_inputs if node_type else 0)
+        self._parm_tuples = []
+        self._parm_tuple_map = {}
+        self._parm_map = {}
+        for spec in (node_type._parms if node_type else ()):
+            template, names, values = spec[:3]
+            menu_script = spec[3] if len(spec) > 3 else None
+            parm_tuple = ParmTuple(self, template, names, values, menu_script)
+            self._parm_tuples.append(parm_tuple)
+            self._parm_tuple_map[template.name()] = parm_tuple
+            for parm in parm_tuple:
+                self._parm_map[parm.name()] = parm
+        _nodes[self._session_id] = self
+
+    def __eq__(self, other):
+        return isinstance(other, Node) and \
+            other._session_id == self._session_id
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return self._session_id
+
+    def __repr__(self):
+        return '<hou.Node %s>' % self.path()
+
+    # identity
+
+    def name(self):
+        return self._name
+
+    def setName(self, name, unique_name=False):
+        if self._parent is not None:
+            siblings = self._parent._children
+            if name in siblings and siblings[name] is not self:
+                if not unique_name:
+                    raise OperationFailed("Name '%s' is in use." % name)
+                name = self._parent._unique_name(name)
+            siblings.pop(self._name, None)
+            siblings[name] = self
+        self._name = name
+        self._fire(nodeEventType.NameChanged)
+
+    def path(self):
+        if self._parent is None:
+            return '/'
+        parent_path = self._parent.path()
+        if parent_path == '/':
+            return '/' + self._name
+        return parent_path + '/' + self._name
+
+    def sessionId(self):
+        return self._session_id
+
+    def type(self):
+        return self._type
+
+    def parent(self):
+        return self._parent
+
+    def children(self):
+        return tuple(self._children.values())
+
+    def allSubChildren(self):
+        nodes = []
+        for child in self._children.values():
+            nodes.append(child)
+            nodes.extend(child.allSubChildren())
+        return tuple(nodes)
+
+    def node(self, path):
+        if path.startswith('/'):
+            return node(path)
+        current = self
+        for part in path.split('/'):
+            if part == '..':
+                current = current._parent
+            elif part and part != '.':
+                current = current._children.get(part)
+            if current is None:
+                return None
+        return current
+
+    def hdaModule(self):
+        return None
+
+    # creation and deletion
+
+    def createNode(self, node_type_name, node_name=None,
+                   run_init_scripts=True):
+        category = self._child_category()
+        node_type = nodeType(category, node_type_name)
+        if node_type is None:
+            raise OperationFailed("Invalid node type name '%s'."
+                                  % node_type_name)
+        name = self._unique_name(node_name or node_type_name)
+        new_node = Node(self, node_type, name)
+        self._children[name] = new_node
+        self._fire(nodeEventType.ChildCreated, child_node=new_node)
+        if run_init_scripts and node_type.on_created:
+            node_type.on_created(new_node)
+        return new_node
+
+    def destroy(self):
+        self._fire(nodeEventType.BeingDeleted)
+        for child in list(self._children.values()):
+            child.destroy()
+        siblings = self._parent.children() if self._parent else ()
+        for sibling in siblings:
+            sibling._inputs = [None if i is self else i
+                               for i in sibling._inputs]
+        if self._parent is not None:
+            self._parent._children.pop(self._name, None)
+        _nodes.pop(self._session_id, None)
+        self._callbacks = []
+
+    def _child_category(self):
+        if self._type is None:
+            return managerNodeTypeCategory()
+        return self._type._child_category
+
+    def _unique_name(self, name):
+        if name not in self._children:
+            return name
+        base = name.rstrip('0123456789')
+        # remember the last suffix used per base name, like Houdini
+        suffixes = self.__dict__.setdefault('_suffixes', {})
+        index = suffixes.get(base, 0)
+        while True:
+            index += 1
+            candidate = '%s%d' % (base, index)
+            if candidate not in self._children:
+                suffixes[base] = index
+                return candidate
+
+    # parms
+
+    def parm(self, name):
+        return self._parm_map.get(name)
+
+    def parms(self):
+        return tuple(p for t in self._parm_tuples for p in t)
+
+    def parmTuple(self, name):
+        return self._parm_tuple_map.get(name)
+
+    def parmTuples(self):
+        return tuple(self._parm_tuples)
+
+    # layout
+
+    def position(self):
+        return self._position
+
+    def setPosition(self, position):
+        self._position = tuple(position)
+
+    def isSelected(self):
+        return getattr(self, '_selected', False)
+
+    def setSelected(self, on, clear_all_selected=False):
+        if clear_all_selected:
+            for existing in _nodes.values():
+                existing._selected = False
+        self._selected = on
+
+    def moveToGoodPosition(self):
+        # like Houdini, look at all siblings to find a free spot
+        siblings = self._parent.children() if self._parent else ()
+        lowest = min([s._position[1] for s in siblings] or [0.0])
+        self._position = (self._position[0], lowest - 1.0)
+
+    def color(self):
+        return self._color
+
+    def setColor(self, color):
+        self._color = color
+
+    # user data
+
+    def userData(self, key):
+        return self._user_data.get(key)
+
+    def setUserData(self, key, value):
+        self._user_data[key] = value
+
+    def destroyUserData(self, key):
+        self._user_data.pop(key, None)
+
+    def userDataDict(self):
+        return dict(self._user_data)
+
+    # connections
+
+    def inputConnectors(self):
+        return tuple(() for _ in self._inputs)
+
+    def inputs(self):
+        return tuple(i for i in self._inputs if i is not None)
+
+    def inputConnections(self):
+        return tuple(NodeConnection(i, self, index)
+                     for index, i in enumerate(self._inputs)
+                     if i is not None)
+
+    def outputConnections(self):
+        connections = []
+        siblings = self._parent.children() if self._parent else ()
+        for sibling in siblings:
+            for index, i in enumerate(sibling._inputs):
+                if i is self:
+                    connections.append(NodeConnection(self, sibling, index))
+        return tuple(connections)
+
+    def outputs(self):
+        return tuple(c.outputNode() for c in self.outputConnections())
+
+    def setInput(self, index, input_node, output_index=0):
+        if index >= len(self._inputs):
+            raise InvalidInput("Invalid input index %d." % index)
+        self._inputs[index] = input_node
+        self._fire(nodeEventType.InputRewired, input_index=index)
+
+    def inputAncestors(self):
+        ancestors = []
+        pending = list(self.inputs())
+        while pending:
+            current = pending.pop()
+            if current not in ancestors:
+                ancestors.append(current)
+                pending.extend(current.inputs())
+        return tuple(ancestors)
+
+    # events
+
+    def addEventCallback(self, event_types, callback):
+        self._callbacks.append((tuple(event_types), callback))
+
+    def removeEventCallback(self, event_types, callback):
+        event_types = tuple(event_types)
+        self._callbacks = [(t, c) for t, c in self._callbacks
+                           if not (t == event_types and c == callback)]
+
+    def eventCallbacks(self):
+        return tuple(self._callbacks)
+
+    def _fire(self, event_type, **kwargs):
+        for event_types, callback in list(self._callbacks):
+            if event_type in event_types:
+                callback(event_type=event_type, node=self, **kwargs)
+
+    # rendering
+
+    def render(self, frame_range=(), ignore_inputs=False, **kwargs):
+        self.rendered_ranges = getattr(self, 'rendered_ranges', [])
+        self.rendered_ranges.append(tuple(frame_range))
+        self.ignored_inputs = ignore_inputs
+
+
+def node(path):
+    if path == '/':
+        return _root
+    if not path or not path.startswith('/'):
+        return None
+    return _root.node(path[1:])
+
+
+def nodeBySessionId(session_id):
+    return _nodes.get(session_id)
+
+
+def selectedNodes():
+    return tuple(n for n in _nodes.values() if n.isSelected())
+
+
+_pwd = None
+
+
+def pwd():
+    return _pwd
+
+
+def setPwd(node):
+    global _pwd
+    _pwd = node
+
+
+def frame():
+    return 1.0
+
+
+################################################################################
+# Hip file
+
+class _HipFile(object):
+    def __init__(self):
+        self._path = '/tmp/untitled.hip'
+        self._callbacks = []
+
+    def path(self):
+        return self._path
+
+    def basename(self):
+        return self._path.rsplit('/', 1)[-1]
+
+    def setName(self, path):
+        self._path = path
+
+    def save(self, file_name=None):
+        self._fire(hipFileEventType.BeforeSave)
+        if file_name:
+            self._path = file_name
+        self._fire(hipFileEventType.AfterSave)
+
+    def clear(self, suppress_save_prompt=True):
+        self._fire(hipFileEventType.BeforeClear)
+        _reset_scene()
+        self._fire(hipFileEventType.AfterClear)
+
+    def load(self, file_name, suppress_save_prompt=True,
+             ignore_load_warnings=True):
+        self._fire(hipFileEventType.BeforeLoad)
+        _reset_scene()
+        self._path = file_name
+        self._fire(hipFileEventType.AfterLoad)
+
+    def addEventCallback(self, callback):
+        self._callbacks.append(callback)
+
+    def removeEventCallback(self, callback):
+        self._callbacks = [c for c in self._callbacks if c != callback]
+
+    def eventCallbacks(self):
+        return tuple(self._callbacks)
+
+    def _fire(self, event_type):
+        for callback in list(self._callbacks):
+            callback(event_type)
+
+
+hipFile = _HipFile()
+
+
+################################################################################
+# Undo and UI
+
+class _Undos(object):
+    @contextlib.contextmanager
+    def group(self, label):
+        yield
+
+    @contextlib.contextmanager
+    def disabler(self):
+        yield
+
+
+undos = _Undos()
+
+
+class _Ui(object):
+    def __init__(self):
+        self.messages = []
+
+    def displayMessage(self, text, *args, **kwargs):
+        self.messages.append(text)
+        return 0
+
+
+ui = _Ui()
+
+
+################################################################################
+# Scene
+
+_root = None
+
+
+def _reset_scene():
+    global _root
+    for existing in list(_nodes.values()):
+        existing._fire(nodeEventType.BeingDeleted)
+    _nodes.clear()
+    _root = Node(None, None, '')
+    for name, type_name in (('obj', 'obj'), ('out', 'out')):
+        manager = Node(_root, nodeType(managerNodeTypeCategory(), type_name),
+                       name)
+        _root._children[name] = manager
+
+
+define_type(managerNodeTypeCategory(), 'obj', max_inputs=0,
+            child_category=objNodeTypeCategory())
+define_type(managerNodeTypeCategory(), 'out', max_inputs=0,
+            child_category=ropNodeTypeCategory())
+_reset_scene()
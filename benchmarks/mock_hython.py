@@ -0,0 +1,91 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+"""
+Stand-in for hython running a script against the mock hou and sgtk modules,
+where starting the tk-houdini engine for a hip file runs the app in a mock
+engine and declares the node types, like installing the OTLs. The project
+root is the part of the hip file path before /sequences/. Loading a hip
+file builds a synthetic scene of MOCK_HYTHON_NODES sgtk nodes (default
+20), which fails if the engine isn't running yet.
+
+    python scripts/geometry_batch.py \\
+        --interpreter "python benchmarks/mock_hython.py" sh010_v003.hip
+"""
+
+import os
+import runpy
+import sys
+
+import harness
+
+APP_PATH = os.path.join(harness.BENCHMARKS_DIR, '..', 'app.py')
+
+
+def make_app(root):
+    """
+    Returns the app of app.py running in a mock engine with the harness
+    templates.
+    """
+    # not runpy.run_path, python 2 clears the globals of the module it ran
+    namespace = {'__name__': 'app', '__file__': APP_PATH}
+    with open(APP_PATH) as app_file:
+        exec(compile(app_file.read(), APP_PATH, 'exec'), namespace)
+    app_class = namespace['GeometryOutputNode']
+    app = app_class(harness.make_templates(root),
+                    {'name': harness.PROFILE[1],
+                     'default_node_name': 'sgtk_geometry'},
+                    harness.sgtk.Context(harness.CONTEXT_FIELDS),
+                    harness.PROFILE[0])
+    app.init_app()
+    harness.sgtk.set_engine(harness.sgtk.Engine({harness.PROFILE[0]: app}))
+    return app
+
+
+def start_engine(engine_name, tk, context):
+    """
+    Runs the app for the project root of the path the context was made
+    from and declares the node types.
+    """
+    app = make_app(context.path.split(os.sep + 'sequences' + os.sep)[0])
+    harness.define_node_types(app.handler)
+    return harness.sgtk.current_engine()
+
+
+def context_from_path(path):
+    context = harness.sgtk.Context(harness.CONTEXT_FIELDS)
+    context.path = path
+    return context
+
+
+def main():
+    harness.install()
+    hou = harness.hou
+    sgtk = harness.sgtk
+    num_nodes = int(os.environ.get('MOCK_HYTHON_NODES', 20))
+    load = hou.hipFile.load
+
+    def load_and_build(file_name, *args, **kwargs):
+        load(file_name, *args, **kwargs)
+        harness.build_scene(num_nodes)
+
+    hou.hipFile.load = load_and_build
+    tk = sgtk.Tank()
+    tk.context_from_path = context_from_path
+    sgtk.sgtk_from_path = lambda path: tk
+    sgtk.platform.start_engine = start_engine
+
+    script = sys.argv[1]
+    sys.argv = sys.argv[1:]
+    runpy.run_path(script, run_name='__main__')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+"""
+In-memory stand-in for the parts of sgtk used by the app: TankError, path
+templates with string, integer and sequence keys, and the app, context and
+tank objects the handler talks to.
+"""
+
+import glob
+import os
+import re
+import types
+
+
+class TankError(Exception):
+    pass
+
+
+################################################################################
+# Template keys
+
+class TemplateKey(object):
+    def __init__(self, name):
+        self.name = name
+
+    def value_from_str(self, str_value):
+        return str_value
+
+    def str_from_value(self, value):
+        return str(value)
+
+    def validate(self, value):
+        return True
+
+
+class StringKey(TemplateKey):
+    pass
+
+
+class IntegerKey(TemplateKey):
+    def __init__(self, name, format_spec=None):
+        TemplateKey.__init__(self, name)
+        self.format_spec = format_spec
+
+    def value_from_str(self, str_value):
+        if not str_value.isdigit():
+            raise TankError("%s: '%s' is not an integer."
+                            % (self.name, str_value))
+        return int(str_value)
+
+    def str_from_value(self, value):
+        if self.format_spec:
+            return ('%' + self.format_spec + 'd') % int(value)
+        return str(int(value))
+
+
+class SequenceKey(TemplateKey):
+    """
+    Frame key, formats frame specs like 'FORMAT: $F' with its padding.
+    """
+
+    FORMAT_REGEX = re.compile(r"^(\$F\d*|%0?\d*d|#+|@+)$")
+
+    def __init__(self, name, format_spec='04'):
+        TemplateKey.__init__(self, name)
+        self.format_spec = format_spec
+
+    def value_from_str(self, str_value):
+        if str_value.lstrip('-').isdigit():
+            return int(str_value)
+        if self.FORMAT_REGEX.match(str_value):
+            return str_value
+        raise TankError("%s: '%s' is not a frame." % (self.name, str_value))
+
+    def str_from_value(self, value):
+        if isinstance(value, int):
+            return ('%' + self.format_spec + 'd') % value
+        if value.startswith('FORMAT:'):
+            spec = value[len('FORMAT:'):].strip()
+            padding = int(self.format_spec)
+            if spec == '$F':
+                return '$F%d' % padding
+            if spec == '%d':
+                return '%%0%dd' % padding
+            if spec == '#':
+                return '#' * padding
+        return str(value)
+
+
+################################################################################
+# Templates
+
+class TemplatePath(object):
+    """
+    Path template with {key} tokens and [optional] sections, relative to
+    root_path.
+    """
+
+    def __init__(self, definition, keys, root_path, name=None):
+        self.name = name
+        self.definition = definition
+        self.root_path = root_path
+        self.keys = {}
+        for key_name in re.findall(r"{(\w+)}", definition):
+            self.keys[key_name] = keys[key_name]
+        self._definitions = self.__expand(definition)
+        self._regexes = [self.__compile(d) for d in self._definitions]
+
+    def __repr__(self):
+        return '<Sgtk TemplatePath %s: %s>' % (self.name, self.definition)
+
+    def validate(self, path, fields=None, skip_keys=None):
+        try:
+            self.get_fields(path)
+        except TankError:
+            return False
+        return True
+
+    def get_fields(self, path, skip_keys=None):
+        path = path.replace('\\', '/')
+        for definition, regex in zip(self._definitions, self._regexes):
+            match = regex.match(path)
+            if not match:
+                continue
+            fields = {}
+            try:
+                for name, value in match.groupdict().items():
+                    fields[name] = self.keys[name].value_from_str(value)
+            except TankError:
+                continue
+            return fields
+        raise TankError("Template %s: path '%s' does not match."
+                        % (self.name, path))
+
+    def apply_fields(self, fields):
+        return self._apply_fields(fields)
+
+    def _apply_fields(self, fields, wildcards=()):
+        for definition in self._definitions:
+            names = re.findall(r"{(\w+)}", definition)
+            if all(fields.get(n) is not None for n in names):
+                break
+        else:
+            missing = [n for n in self.keys if fields.get(n) is None]
+            raise TankError("Template %s: missing fields %s"
+                            % (self.name, missing))
+
+        return self._apply_definition(definition, fields, wildcards)
+
+    def _apply_definition(self, definition, fields, wildcards=()):
+        def replace(match):
+            if match.group(1) in wildcards:
+                return '*'
+            key = self.keys[match.group(1)]
+            return key.str_from_value(fields[match.group(1)])
+
+        relative = re.sub(r"{(\w+)}", replace, definition)
+        return os.path.join(self.root_path, *relative.split('/'))
+
+    def missing_keys(self, fields, skip_defaults=False):
+        return [n for n in self.keys if n not in fields]
+
+    def __expand(self, definition):
+        """
+        Returns all definitions with and without the optional sections,
+        longest first.
+        """
+        optional = re.search(r"\[([^\[\]]*)\]", definition)
+        if not optional:
+            return [definition]
+        with_section = (definition[:optional.start()] + optional.group(1) +
+                        definition[optional.end():])
+        without_section = (definition[:optional.start()] +
+                           definition[optional.end():])
+        return self.__expand(with_section) + self.__expand(without_section)
+
+    def __compile(self, definition):
+        root = self.root_path.replace('\\', '/').rstrip('/')
+        pattern = re.escape(root + '/')
+        seen = set()
+        for token in re.split(r"({\w+})", definition):
+            match = re.match(r"^{(\w+)}$", token)
+            if not match:
+                pattern += re.escape(token)
+            elif match.group(1) in seen:
+                pattern += '(?P=%s)' % match.group(1)
+            else:
+                seen.add(match.group(1))
+                pattern += '(?P<%s>[^/]+?)' % match.group(1)
+        return re.compile(pattern + '$')
+
+
+################################################################################
+# App, context and tank
+
+class Context(object):
+    def __init__(self, fields):
+        self._fields = dict(fields)
+
+    def __repr__(self):
+        return '<Sgtk Context: %s>' % sorted(self._fields.items())
+
+    def as_template_fields(self, template):
+        return dict((k, v) for k, v in self._fields.items()
+                    if k in template.keys)
+
+
+class Tank(object):
+    def paths_from_template(self, template, fields, skip_keys=None):
+        # like Toolkit, skipped keys are wildcards and the optional sections
+        # of missing keys are left out
+        skip_keys = set(skip_keys or [])
+        paths = set()
+        for definition in template._definitions:
+            names = set(re.findall(r"{(\w+)}", definition))
+            if any(n not in fields and n not in skip_keys for n in names):
+                continue
+            wildcards = names & skip_keys
+            glob_fields = dict(fields)
+            for name in wildcards:
+                glob_fields[name] = '*'
+            pattern = template._apply_definition(definition, glob_fields,
+                                                 wildcards)
+            paths.update(glob.glob(pattern))
+        return sorted(p for p in paths if template.validate(p))
+
+
+class Application(object):
+    """
+    Minimal app: templates, settings, context, tank and a log.
+    """
+
+    name = 'tk-houdini-geometrynode'
+
+    def __init__(self, templates, settings, context, instance_name=None):
+        self._templates = templates
+        self._settings = settings
+        self.context = context
+        self.tank = Tank()
+        self.instance_name = instance_name or self.name
+        self.engine = None
+        self.log = []
+
+    def get_template(self, name):
+        return self._templates.get(name)
+
+    def get_setting(self, name, default=None):
+        return self._settings.get(name, default)
+
+    def import_module(self, name):
+        return __import__(name)
+
+    def log_debug(self, msg):
+        self.log.append(('debug', msg))
+
+    def log_info(self, msg):
+        self.log.append(('info', msg))
+
+    def log_warning(self, msg):
+        self.log.append(('warning', msg))
+
+    def log_error(self, msg):
+        self.log.append(('error', msg))
+
+
+class Engine(object):
+    def __init__(self, apps=None):
+        self.apps = apps or {}
+        for app in self.apps.values():
+            app.engine = self
+
+
+_engine = None
+
+
+def current_engine():
+    return _engine
+
+
+def set_engine(engine):
+    global _engine
+    _engine = engine
+
+
+platform = types.ModuleType('sgtk.platform')
+platform.Application = Application
+platform.current_engine = current_engine
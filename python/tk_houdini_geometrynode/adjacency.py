@@ -0,0 +1,97 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+import uuid
+
+import hou
+
+# identifies this Houdini session in stored connections, session ids are
+# only meaningful within the session that stored them
+SESSION = uuid.uuid4().hex
+
+
+class AdjacencyIndex(object):
+    """
+    Snapshot of the connections inside the networks of a set of nodes,
+    taken once before they are replaced.
+
+    Nodes are referenced by session id. Replaced nodes are followed to
+    their replacement, so connections between nodes replaced in any order
+    resolve to the current nodes.
+    """
+
+    def __init__(self, nodes):
+        # session id -> [(input index, input session id)]
+        self._inputs = {}
+        # session id -> [(output session id, input index)]
+        self._outputs = {}
+        # replaced session id -> replacement session id
+        self._replaced = {}
+
+        parents = {}
+        for node in nodes:
+            parent = node.parent()
+            parents[parent.sessionId()] = parent
+
+        for parent in parents.values():
+            for child in parent.children():
+                child_id = child.sessionId()
+                for connection in child.inputConnections():
+                    input_node = connection.inputNode()
+                    if input_node is None:
+                        continue
+                    input_id = input_node.sessionId()
+                    index = connection.inputIndex()
+                    self._inputs.setdefault(child_id, []).append(
+                        (index, input_id))
+                    self._outputs.setdefault(input_id, []).append(
+                        (child_id, index))
+
+    def inputs(self, node):
+        """
+        Returns the (input index, input node) connections of the node as
+        they were when the index was built.
+        """
+        connections = []
+        for index, input_id in self._inputs.get(node.sessionId(), ()):
+            input_node = self.resolve(input_id)
+            if input_node is not None:
+                connections.append((index, input_node))
+        return connections
+
+    def outputs(self, node):
+        """
+        Returns the (output node, input index) connections of the node as
+        they were when the index was built.
+        """
+        connections = []
+        for output_id, index in self._outputs.get(node.sessionId(), ()):
+            output_node = self.resolve(output_id)
+            if output_node is not None:
+                connections.append((output_node, index))
+        return connections
+
+    def replace(self, node, replacement):
+        """
+        Records that node is being replaced by replacement. Call before
+        destroying node.
+        """
+        self._replaced[node.sessionId()] = replacement.sessionId()
+
+    def resolve(self, session_id):
+        """
+        Returns the current node of a session id, following replacements,
+        or None if it doesn't exist anymore.
+        """
+        seen = set()
+        while session_id in self._replaced and session_id not in seen:
+            seen.add(session_id)
+            session_id = self._replaced[session_id]
+        return hou.nodeBySessionId(session_id)
@@ -0,0 +1,107 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+import hou
+import sgtk
+
+
+class CameraNotFound(sgtk.TankError):
+    """
+    Raised when the camera a node's output path depends on doesn't exist.
+    """
+
+
+class CameraCache(object):
+    """
+    Resolutions of the cameras output paths depend on, by camera path.
+
+    An entry is dropped as soon as the resolution of its camera changes or
+    the camera is renamed or deleted. Missing cameras aren't cached, they
+    may be created at any time, but each is only reported once until it
+    shows up.
+    """
+
+    EVENT_TYPES = (hou.nodeEventType.ParmTupleChanged,
+                   hou.nodeEventType.NameChanged,
+                   hou.nodeEventType.BeingDeleted)
+
+    def __init__(self, on_change=None):
+        """
+        on_change: Optional callable receiving the session id of a camera
+                   whose entry was dropped.
+        """
+        self._on_change = on_change
+        # camera path -> (session id, resx, resy)
+        self._cameras = {}
+        # session id -> camera path
+        self._paths = {}
+        self._missing = set()
+
+    def get(self, path):
+        """
+        Returns (session id, resx, resy) of the camera at path. Raises
+        CameraNotFound if there is no node at path.
+        """
+        camera = self._cameras.get(path)
+        if camera is not None:
+            return camera
+
+        cam_node = hou.node(path)
+        if cam_node is None:
+            raise CameraNotFound("Camera %s not found." % path)
+
+        camera = (cam_node.sessionId(),
+                  cam_node.parm("resx").eval(),
+                  cam_node.parm("resy").eval())
+        self._cameras[path] = camera
+        self._missing.discard(path)
+        if camera[0] not in self._paths:
+            cam_node.addEventCallback(self.EVENT_TYPES, self.__on_event)
+        self._paths[camera[0]] = path
+        return camera
+
+    def report_missing(self, path):
+        """
+        Returns True the first time it is called for a missing camera path,
+        False afterwards until the camera has been found.
+        """
+        if path in self._missing:
+            return False
+        self._missing.add(path)
+        return True
+
+    def clear(self, unwatch=True):
+        """
+        Drops all entries. unwatch=False skips removing the event callbacks
+        of the cameras, for when they are gone already.
+        """
+        if unwatch:
+            for cam_id in self._paths:
+                cam_node = hou.nodeBySessionId(cam_id)
+                if cam_node:
+                    cam_node.removeEventCallback(self.EVENT_TYPES,
+                                                 self.__on_event)
+        self._cameras.clear()
+        self._paths.clear()
+        self._missing.clear()
+
+    def __on_event(self, event_type, **kwargs):
+        cam_id = kwargs['node'].sessionId()
+        parm_tuple = kwargs.get('parm_tuple')
+        if event_type == hou.nodeEventType.ParmTupleChanged and \
+                parm_tuple is not None and parm_tuple.name() != 'res':
+            # only the resolution ends up in the path
+            return
+
+        self._cameras.pop(self._paths.get(cam_id), None)
+        if event_type == hou.nodeEventType.BeingDeleted:
+            self._paths.pop(cam_id, None)
+        if self._on_change:
+            self._on_change(cam_id)
@@ -0,0 +1,131 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+"""
+Disk usage of the cached versions of nodes.
+
+A report is a list of node entries:
+
+    [{"node": <node path>, "profile": <profile name>,
+      "total_bytes": <bytes of all versions>,
+      "versions": [{"version": <version>, "pattern": <output path>,
+                    "frames": <count>, "total_bytes": <bytes>,
+                    "bytes_per_frame": <bytes>,
+                    "first_written": <mtime>, "last_written": <mtime>,
+                    "bytes_per_second": <write throughput or None>}, ...]}]
+"""
+
+import csv
+import json
+import os
+from multiprocessing.pool import ThreadPool
+
+CSV_COLUMNS = ('node', 'profile', 'version', 'pattern', 'frames',
+               'total_bytes', 'bytes_per_frame', 'first_written',
+               'last_written', 'bytes_per_second')
+
+
+def _stat(path):
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return path, info.st_size, info.st_mtime
+
+
+def stat_files(paths, workers=8):
+    """
+    Returns a dictionary of path -> (size, mtime) of the files that exist,
+    stat'ed on a pool of threads.
+    """
+    pool = ThreadPool(max(1, int(workers)))
+    try:
+        results = pool.imap_unordered(_stat, paths, chunksize=64)
+        return dict((r[0], r[1:]) for r in results if r is not None)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def summarize_version(version, pattern, files):
+    """
+    Returns the version entry of the (size, mtime) of its files.
+
+    The write throughput is the size of all frames but the first divided
+    by the time between the first and the last write, None if they were
+    written at the same time.
+    """
+    entry = {'version': version,
+             'pattern': pattern,
+             'frames': len(files),
+             'total_bytes': sum(size for size, _ in files),
+             'bytes_per_frame': None,
+             'first_written': None,
+             'last_written': None,
+             'bytes_per_second': None}
+    if not files:
+        return entry
+
+    files = sorted(files, key=lambda f: f[1])
+    entry['bytes_per_frame'] = float(entry['total_bytes']) / len(files)
+    entry['first_written'] = files[0][1]
+    entry['last_written'] = files[-1][1]
+    duration = files[-1][1] - files[0][1]
+    if duration > 0:
+        entry['bytes_per_second'] = \
+            (entry['total_bytes'] - files[0][0]) / duration
+    return entry
+
+
+def prune_candidates(report, keep=2, protect=None):
+    """
+    Returns the versions that would be deleted to keep only the latest keep
+    versions of each node, as dictionaries with node, version, pattern,
+    frames and total_bytes. Nothing is deleted.
+
+    protect: Optional version never listed, like the version of the
+             current work file.
+    """
+    candidates = []
+    for node in report:
+        versions = sorted(node['versions'], key=lambda v: v['version'])
+        old = versions[:-keep] if keep > 0 else versions
+        for version in old:
+            if version['version'] == protect:
+                continue
+            candidates.append({'node': node['node'],
+                               'version': version['version'],
+                               'pattern': version['pattern'],
+                               'frames': version['frames'],
+                               'total_bytes': version['total_bytes']})
+    return candidates
+
+
+def write_report(report, path):
+    """
+    Writes the report as csv, one row per node version, if path ends with
+    .csv and as json otherwise.
+    """
+    if path.lower().endswith('.csv'):
+        # csv wants bytes in python 2 and text in python 3
+        mode = 'wb' if str is bytes else 'w'
+        kwargs = {} if str is bytes else {'newline': ''}
+        with open(path, mode, **kwargs) as report_file:
+            writer = csv.writer(report_file)
+            writer.writerow(CSV_COLUMNS)
+            for node in report:
+                for version in node['versions']:
+                    row = dict(version, node=node['node'],
+                               profile=node['profile'])
+                    writer.writerow([row[c] for c in CSV_COLUMNS])
+    else:
+        with open(path, 'w') as report_file:
+            json.dump(report, report_file, indent=2, sort_keys=True)
+    return path
@@ -0,0 +1,164 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+"""
+Splits node renders into frame chunks for farm submission.
+
+A plan is plain json:
+
+    {"version": 1,
+     "nodes": [{"node": <node path>, "depends_on": [<node path>, ...],
+                "first": <frame>, "last": <frame>, "step": <step>,
+                "frame_seconds": <estimate>, "estimate": <source>,
+                "chunk_size": <frames>, ...}],
+     "tasks": [{"id": <task id>, "node": <node path>,
+                "start": <frame>, "end": <frame>, "step": <step>,
+                "frames": <count>, "estimated_seconds": <seconds>,
+                "depends_on": [<task id>, ...]}]}
+
+Nodes and tasks are in dependency order: every task comes after the tasks
+it depends on, so they can be run in order by a sequential scheduler.
+"""
+
+PLAN_VERSION = 1
+
+# seconds per frame assumed when there is nothing to estimate it from
+DEFAULT_FRAME_SECONDS = 10.0
+
+ESTIMATE_TIMINGS = 'timings'
+ESTIMATE_SIZES = 'sizes'
+ESTIMATE_DEFAULT = 'default'
+
+
+def estimate_frame_seconds(frames, bytes_per_second=None,
+                           default=DEFAULT_FRAME_SECONDS):
+    """
+    Estimates the render time per frame from the (frame, path, size, mtime)
+    entries of a previous render. Returns (seconds, source).
+
+    Frames written one after the other are timed by the median delay
+    between their modification times. If that's not possible, the mean
+    file size is converted with bytes_per_second when given.
+    """
+    frames = sorted(frames or [])
+    deltas = sorted(b[3] - a[3] for a, b in zip(frames, frames[1:])
+                    if b[3] > a[3])
+    if deltas:
+        return deltas[len(deltas) // 2], ESTIMATE_TIMINGS
+
+    sizes = [size for _, _, size, _ in frames if size]
+    if sizes and bytes_per_second:
+        return (float(sum(sizes)) / len(sizes) / bytes_per_second,
+                ESTIMATE_SIZES)
+
+    return default, ESTIMATE_DEFAULT
+
+
+def chunk_size(frame_seconds, target_seconds, max_frames=None):
+    """
+    Returns the number of frames per chunk so that a chunk takes about
+    target_seconds, at least 1 and at most max_frames.
+    """
+    size = int(target_seconds / frame_seconds) if frame_seconds > 0 else 0
+    if max_frames:
+        size = min(size, max_frames)
+    return max(1, size)
+
+
+def split_frames(frames, size):
+    """
+    Returns the frames as (start, end, step) chunks of at most size frames.
+    """
+    frames = list(frames)
+    step = frames[1] - frames[0] if len(frames) > 1 else 1
+    return [(chunk[0], chunk[-1], step)
+            for chunk in (frames[i:i + size]
+                          for i in range(0, len(frames), size))]
+
+
+def sort_nodes(nodes):
+    """
+    Returns the node entries ordered so that each comes after the nodes it
+    depends on. Dependencies on nodes not in the list are ignored.
+    """
+    by_path = dict((node['node'], node) for node in nodes)
+    ordered = []
+    visited = {}
+
+    def visit(path, chain):
+        state = visited.get(path)
+        if state == 'done':
+            return
+        if state == 'active':
+            raise ValueError("Dependency cycle: %s" % ' -> '.join(chain))
+        visited[path] = 'active'
+        for dependency in by_path[path]['depends_on']:
+            if dependency in by_path:
+                visit(dependency, chain + [dependency])
+        visited[path] = 'done'
+        ordered.append(by_path[path])
+
+    for node in nodes:
+        visit(node['node'], [node['node']])
+    return ordered
+
+
+def build_plan(nodes, target_seconds, max_frames=None):
+    """
+    Returns the plan of the given node entries. Each entry is a dictionary
+    with at least node, depends_on (node paths), frames (the rendered
+    frames) and frame_seconds; other keys are kept in the plan.
+
+    A chunk depends on the chunks of the nodes it depends on that render
+    any of its frames, or on all of their chunks if none does.
+    """
+    nodes = sort_nodes(nodes)
+    node_tasks = {}
+    plan_nodes = []
+    tasks = []
+
+    for node in nodes:
+        frames = list(node['frames'])
+        size = chunk_size(node['frame_seconds'], target_seconds, max_frames)
+        chunks = split_frames(frames, size) if frames else []
+
+        entry = dict((key, value) for key, value in node.items()
+                     if key != 'frames')
+        entry['depends_on'] = [path for path in node['depends_on']
+                               if path in node_tasks]
+        entry.update({'first': frames[0] if frames else None,
+                      'last': frames[-1] if frames else None,
+                      'step': chunks[0][2] if chunks else None,
+                      'chunk_size': size})
+        plan_nodes.append(entry)
+
+        node_tasks[node['node']] = []
+        for start, end, step in chunks:
+            count = len(range(start, end + 1, step))
+            depends_on = []
+            for dependency in entry['depends_on']:
+                upstream = node_tasks[dependency]
+                overlapping = [task for task in upstream
+                               if task['start'] <= end and
+                               task['end'] >= start]
+                depends_on += [task['id'] for task in overlapping or upstream]
+
+            task = {'id': '%s:%d-%d' % (node['node'], start, end),
+                    'node': node['node'],
+                    'start': start,
+                    'end': end,
+                    'step': step,
+                    'frames': count,
+                    'estimated_seconds': count * node['frame_seconds'],
+                    'depends_on': depends_on}
+            node_tasks[node['node']].append(task)
+            tasks.append(task)
+
+    return {'version': PLAN_VERSION, 'nodes': plan_nodes, 'tasks': tasks}
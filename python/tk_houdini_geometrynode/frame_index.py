@@ -0,0 +1,250 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+import os
+import re
+import stat
+import threading
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+# Houdini ($F4, ${F4}), printf (%04d) and hash (####) frame tokens
+FRAME_TOKEN_REGEX = re.compile(r"\$\{?F(\d*)\}?|%(?:0(\d+))?d|(#+)")
+
+
+def _frame_padding(match):
+    """
+    Returns the number of digits of a FRAME_TOKEN_REGEX match, 1 if the
+    token has no padding.
+    """
+    if match.group(3):
+        return len(match.group(3))
+    padding = match.group(1) or match.group(2)
+    return int(padding) if padding else 1
+
+
+def compile_frame_pattern(file_name):
+    """
+    Returns a compiled regex matching the file names of all frames of the
+    sequence described by file_name, or None if the file name has no frame
+    token. The frame number is captured in the 'frame' group.
+    """
+    matches = list(FRAME_TOKEN_REGEX.finditer(file_name))
+    if len(matches) != 1:
+        return None
+
+    match = matches[0]
+    pattern = "%s(?P<frame>-?\\d{%d,})%s" % (
+        re.escape(file_name[:match.start()]),
+        _frame_padding(match),
+        re.escape(file_name[match.end():]))
+    return re.compile(pattern + "$")
+
+
+def format_frame_path(file_name, frame):
+    """
+    Returns file_name with its frame token replaced by the given frame.
+    """
+    def replace(match):
+        return '%0*d' % (_frame_padding(match), frame)
+    return FRAME_TOKEN_REGEX.sub(replace, file_name, count=1)
+
+
+def normalize_frame_pattern(file_name):
+    """
+    Returns file_name with its frame token in printf form, so that
+    equivalent Houdini, printf and hash tokens compare equal.
+    """
+    def replace(match):
+        return '%%0%dd' % _frame_padding(match)
+    return FRAME_TOKEN_REGEX.sub(replace, file_name, count=1)
+
+
+def contiguous_chunks(frames, step=1):
+    """
+    Returns the sorted frames as a minimal list of (start, end, step)
+    ranges of frames step apart.
+    """
+    chunks = []
+    for frame in sorted(frames):
+        if chunks and frame == chunks[-1][1] + step:
+            chunks[-1][1] = frame
+        else:
+            chunks.append([frame, frame])
+    return [(start, end, step) for start, end in chunks]
+
+
+def summarize_frames(frames):
+    """
+    Returns a summary dictionary of the given frame entries as returned by
+    FrameIndex.find.
+    """
+    numbers = [frame for frame, _, _, _ in frames]
+    summary = {'first': None,
+               'last': None,
+               'count': len(numbers),
+               'missing': [],
+               'total_bytes': sum(size for _, _, size, _ in frames)}
+    if numbers:
+        summary['first'] = numbers[0]
+        summary['last'] = numbers[-1]
+        existing = set(numbers)
+        summary['missing'] = [frame for frame in
+                              range(numbers[0], numbers[-1] + 1)
+                              if frame not in existing]
+    return summary
+
+
+def restat_frames(frames):
+    """
+    Returns (frame, path, size, mtime) tuples with the current size and
+    mtime of their file, without the ones that don't exist anymore.
+    """
+    current = []
+    for frame, path, _, _ in frames:
+        try:
+            info = os.stat(path)
+        except OSError:
+            continue
+        current.append((frame, path, info.st_size, info.st_mtime))
+    return current
+
+
+class FrameIndex(object):
+    """
+    Per directory index of the frames written to disk.
+
+    Every directory is listed once and the listing is reused for as long as
+    the modification time of the directory doesn't change, so revalidating
+    a cached lookup costs a single stat call. Rewriting a file in place
+    doesn't change the directory though: the list of frames stays right but
+    their sizes and mtimes may not, callers using them ask for the frames
+    to be stat'ed again. Lookups may run on worker threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # directory -> (mtime, [(name, size, mtime), ...])
+        self._listings = {}
+        # file name -> (directory mtime, frames)
+        self._frames = {}
+
+    def find(self, file_name, scan=True, restat=False):
+        """
+        Returns a list of (frame, path, size, mtime) tuples, sorted by frame,
+        for all frames on disk matching file_name, or None if file_name is
+        not a frame sequence that can be indexed.
+
+        scan: If False, only answer from a listing that is cached and still
+              valid, return None otherwise.
+        restat: If True, the sizes and mtimes of frames answered from a
+                cached listing are stat'ed again.
+        """
+        directory, base_name = os.path.split(file_name)
+        if FRAME_TOKEN_REGEX.search(directory):
+            # frame numbers in directory names need a real glob
+            return None
+
+        pattern = compile_frame_pattern(base_name)
+        if not pattern:
+            return None
+
+        directory = os.path.normpath(directory)
+        with self._lock:
+            return self.__find(file_name, directory, pattern, scan, restat)
+
+    def __find(self, file_name, directory, pattern, scan, restat):
+        mtime, entries, scanned = self.__list_directory(directory, scan)
+        if mtime is None and not scan:
+            return None
+
+        cached = self._frames.get(file_name)
+        if cached and mtime is not None and cached[0] == mtime:
+            if not restat:
+                return cached[1]
+            frames = restat_frames(cached[1])
+        else:
+            frames = []
+            for name, size, file_mtime in entries:
+                match = pattern.match(name)
+                if match:
+                    frames.append((int(match.group('frame')),
+                                   os.path.join(directory, name),
+                                   size,
+                                   file_mtime))
+            frames.sort()
+            if restat and not scanned:
+                frames = restat_frames(frames)
+
+        self._frames[file_name] = (mtime, frames)
+        return frames
+
+    def invalidate(self, directory=None):
+        """
+        Drops the cached listing of the directory, or all listings.
+        """
+        with self._lock:
+            self.__invalidate(directory)
+
+    def __invalidate(self, directory):
+        if directory is None:
+            self._listings.clear()
+            self._frames.clear()
+        else:
+            directory = os.path.normpath(directory)
+            self._listings.pop(directory, None)
+            for file_name in list(self._frames):
+                if os.path.normpath(os.path.dirname(file_name)) == directory:
+                    del self._frames[file_name]
+
+    def __list_directory(self, directory, scan=True):
+        try:
+            mtime = os.stat(directory).st_mtime
+        except OSError:
+            self._listings.pop(directory, None)
+            return None, [], False
+
+        cached = self._listings.get(directory)
+        if cached and cached[0] == mtime:
+            return cached[0], cached[1], False
+        if not scan:
+            return None, [], False
+
+        listing = (mtime, self.__scan(directory))
+        self._listings[directory] = listing
+        return listing[0], listing[1], True
+
+    def __scan(self, directory):
+        entries = []
+        if scandir:
+            for entry in scandir(directory):
+                try:
+                    if not entry.is_file():
+                        continue
+                    info = entry.stat()
+                except OSError:
+                    continue
+                entries.append((entry.name, info.st_size, info.st_mtime))
+        else:
+            for name in os.listdir(directory):
+                try:
+                    info = os.stat(os.path.join(directory, name))
+                except OSError:
+                    continue
+                if stat.S_ISREG(info.st_mode):
+                    entries.append((name, info.st_size, info.st_mtime))
+        return entries
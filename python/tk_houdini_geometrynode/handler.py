@@ -8,16 +8,28 @@
 # agreement to the MIT License. All rights
 # not expressly granted therein are reserved by Pixomondo.
 
-import base64
+import contextlib
+import hashlib
+import math
 import os
-import pickle
-import sys
-import zlib
+import time
 
 import hou
 
 import sgtk
 
+from . import disk_usage, farm, user_data
+from .adjacency import SESSION, AdjacencyIndex
+from .camera_cache import CameraCache, CameraNotFound
+from .frame_index import (FrameIndex, contiguous_chunks, format_frame_path,
+                          normalize_frame_pattern, summarize_frames)
+from .instrumentation import Instrumentation
+from .manifest import ManifestStore
+from .path_cache import PathCache
+from .profiles import ProfileTable, make_profile
+from .registry import NodeRegistry
+from .template_match import TemplateMatcher, match_fields
+
 
 class ToolkitGeometryNodeHandler(object):
 
@@ -25,68 +37,254 @@ class ToolkitGeometryNodeHandler(object):
     PARM_OUTPUT_PATH = 'sopoutput'
     PARM_CONFIG = 'geometry_config'
 
+    # entry points timed when instrumentation is enabled, the OTL callbacks
+    # are about hou.pwd()
+    INSTRUMENTED_CALLBACKS = ('create_output_path_menu',
+                              'on_copy_path_to_clipboard_button_callback',
+                              'on_show_in_fs_button_callback',
+                              'create_file_node')
+    INSTRUMENTED_METHODS = ('convert_sg_to_geometry_nodes',
+                            'convert_geometry_to_sg_nodes',
+                            'create_file_nodes')
+
+    # spacing of nodes laid out on a grid, in network editor units
+    GRID_SPACING = (3.0, 1.5)
+
     def __init__(self, app):
         self._app = app
-        self._work_file_template = self._app.get_template("work_file_template")
+
+        # templates and settings of every configured profile
+        apps = [self._app]
+        if self._app.engine:
+            apps = [a for a in self._app.engine.apps.values()
+                    if a.name == self._app.name]
+        self._profiles = ProfileTable(apps, self.PARM_CONFIG)
+        # the other instances, OnCreated only calls into one of them
+        self._sibling_apps = [a for a in apps if a is not self._app]
+        self._default_profile = self._profiles.get(self._app.instance_name) \
+            or make_profile(self._app)
+
+        # resolved output paths, invalidated by hip file, node and camera
+        # events
+        self._path_cache = PathCache()
+        # (id(template), context key) -> (template, context fields)
+        self._context_fields = {}
+        self._watched_nodes = set()
+        self._cameras = CameraCache(self._path_cache.invalidate_camera)
+        self._frame_index = FrameIndex()
+        # parsed hip file and render paths
+        self._template_matcher = TemplateMatcher()
+        self._manifests = ManifestStore()
+
+        # pending show in file system lookup
+        self._fs_lookup = None
+
+        # parm copy plans by (source type, target type, exclude)
+        self._copy_plans = {}
+
+        # sgtk nodes of the scene
+        self._registry = NodeRegistry(self.__scan_nodes,
+                                      self.get_node_profile_name,
+                                      self.PARM_CONFIG, self.SG_NODE_CLASS)
+        hou.hipFile.addEventCallback(self.__on_hip_file_event)
+
+        # resolved paths stored on the nodes when saving
+        self._store_paths = bool(
+            self._app.get_setting('store_resolved_paths'))
+
+        self._instrumentation = None
+        if self._app.get_setting('enable_instrumentation'):
+            self.enable_instrumentation()
+
+    def destroy(self):
+        """
+        Removes all event callbacks registered by the handler.
+        """
+        hou.hipFile.removeEventCallback(self.__on_hip_file_event)
+        self.__unwatch_all()
+        self._registry.invalidate()
 
     ############################################################################
     # Public methods
 
     def compute_path(self, node):
-        # Get relevant fields from the scene filename and contents
-        work_file_fields = self.__get_hipfile_fields()
-        if not work_file_fields:
-            msg = "This Houdini file is not a Shotgun Toolkit work file!"
-            raise sgtk.TankError(msg)
+        # Get the templates of the node's profile
+        template = self.__get_template(node, "work_cache_template")
 
-        # Get the templates from the app
-        template = self._app.get_template("work_cache_template")
+        camera = self.__get_camera_resolution(node, template)
 
-        # create fields dict with all the metadata
-        fields = {}
-        fields["name"] = work_file_fields.get("name")
-        fields["version"] = work_file_fields["version"]
-        fields["renderpass"] = node.name()
-        fields["SEQ"] = "FORMAT: $F"
+        context_key = repr(self._app.context)
+        key = self.__get_path_cache_key(node, camera, hou.hipFile.path(),
+                                        context_key)
+        path = self._path_cache.get(key)
+        if path is not None:
+            return path
 
-        # Get the camera width and height if necessary
-        if "width" in template.keys or "height" in template.keys:
-            # Get the camera
-            cam_path = node.parm("geometry1_camera").eval()
-            cam_node = hou.node(cam_path)
-            if not cam_node:
-                raise sgtk.TankError("Camera %s not found." % cam_path)
+        path = self.__get_stored_path(node, key, template)
+        if path is None:
+            path = self.__build_path(
+                node, template, camera,
+                *self.__get_scene_fields(node, template, context_key))
+        self.__cache_path(key, path, node, camera)
 
-            fields["width"] = cam_node.parm("resx").eval()
-            fields["height"] = cam_node.parm("resy").eval()
+        return path
 
-        fields.update(self._app.context.as_template_fields(template))
+    def compute_paths(self, nodes=None):
+        """
+        Computes the output paths of many nodes in one pass.
 
-        path = template.apply_fields(fields)
-        path = path.replace(os.path.sep, "/")
+        The hip file and context fields are resolved only once per profile.
 
-        return path
+        Returns a dictionary of node path -> output path. Nodes whose path
+        could not be resolved are logged and left out.
+        """
+        if nodes is None:
+            nodes = self.get_nodes()
+
+        hip_path = hou.hipFile.path()
+        context_key = repr(self._app.context)
+
+        # (id(work file template), id(cache template)) -> scene fields
+        scene_fields = {}
+        paths = {}
+        for node in nodes:
+            try:
+                template = self.__get_template(node, "work_cache_template")
+                camera = self.__get_camera_resolution(node, template)
+                key = self.__get_path_cache_key(node, camera, hip_path,
+                                                context_key)
+                path = self._path_cache.get(key)
+                if path is None:
+                    path = self.__get_stored_path(node, key, template)
+                    if path is None:
+                        fields_key = (id(self.__get_template(
+                            node, "work_file_template")), id(template))
+                        fields = scene_fields.get(fields_key)
+                        if fields is None:
+                            fields = self.__get_scene_fields(node, template,
+                                                             context_key)
+                            scene_fields[fields_key] = fields
+                        path = self.__build_path(node, template, camera,
+                                                 *fields)
+                    self.__cache_path(key, path, node, camera)
+                paths[node.path()] = path
+            except sgtk.TankError as err:
+                self.__log_path_error(node, err)
+
+        return paths
+
+    def find_output_collisions(self, nodes=None):
+        """
+        Finds the nodes resolving to the same output path, for example nodes
+        of the same name in different networks, which would overwrite each
+        other's files.
+
+        Paths are resolved in one compute_paths pass and indexed by their
+        normalized form, so differently written frame tokens, separators
+        and on Windows letter case still match.
+
+        Returns a list of collisions, each a dictionary with the output
+        path, the node paths and the frames more than one node renders.
+        """
+        paths = self.compute_paths(nodes)
+
+        index = {}
+        for node_path, path in paths.items():
+            key = os.path.normcase(
+                os.path.normpath(normalize_frame_pattern(path)))
+            index.setdefault(key, []).append(node_path)
+
+        collisions = []
+        for node_paths in index.values():
+            if len(node_paths) < 2:
+                continue
+            node_paths.sort()
+
+            rendered = set()
+            overlapping = set()
+            for node_path in node_paths:
+                frames = set(self.__get_frame_range(hou.node(node_path)))
+                overlapping |= rendered & frames
+                rendered |= frames
+
+            collisions.append({'path': paths[node_paths[0]],
+                               'nodes': node_paths,
+                               'overlapping_frames': sorted(overlapping)})
+
+        collisions.sort(key=lambda collision: collision['path'])
+        return collisions
+
+    def get_path_cache_stats(self):
+        """
+        Returns the hit/miss counters of the output path cache
+        """
+        return self._path_cache.stats()
+
+    def enable_instrumentation(self, capacity=1000):
+        """
+        Starts timing the OTL callbacks and conversion methods. The latest
+        capacity calls are kept for percentiles and the per node breakdown.
+        Disabled by default, in which case nothing is wrapped.
+        """
+        if self._instrumentation:
+            return
+        self._instrumentation = Instrumentation(capacity)
+
+        def get_pwd_path():
+            node = hou.pwd()
+            return node.path() if node else None
+
+        for name in self.INSTRUMENTED_CALLBACKS:
+            setattr(self, name, self._instrumentation.wrap(
+                name, getattr(self, name), get_pwd_path))
+        for name in self.INSTRUMENTED_METHODS:
+            setattr(self, name, self._instrumentation.wrap(
+                name, getattr(self, name)))
+
+    def disable_instrumentation(self):
+        """
+        Stops timing and drops all recorded data.
+        """
+        if not self._instrumentation:
+            return
+        for name in self.INSTRUMENTED_CALLBACKS + self.INSTRUMENTED_METHODS:
+            delattr(self, name)
+        self._instrumentation = None
+
+    def get_instrumentation_report(self):
+        """
+        Returns the timings recorded since instrumentation was enabled, or
+        None if it is disabled. See Instrumentation.report.
+        """
+        if not self._instrumentation:
+            return None
+        return self._instrumentation.report()
 
     def get_nodes(self, class_=None):
         """
         Returns a list of sgtk nodes
         """
-        node_class = ToolkitGeometryNodeHandler.SG_NODE_CLASS
-        sop = True if not class_ or class_ == 'sop' else False
-        rop = True if not class_ or class_ == 'rop' else False
-        nodes = []
-        if sop:
-            nodes += hou.nodeType(hou.sopNodeTypeCategory(),
-                                  node_class).instances()
-        if rop:
-            nodes += hou.nodeType(hou.ropNodeTypeCategory(),
-                                  node_class).instances()
-        return nodes
+        return self._registry.nodes(class_)
+
+    def get_node(self, path):
+        """
+        Returns the sgtk node at the given path or None
+        """
+        return self._registry.node(path)
+
+    def get_nodes_by_profile(self, profile):
+        """
+        Returns a list of sgtk nodes using the named profile
+        """
+        return self._registry.nodes_by_profile(profile)
 
     def get_node_profile_name(self, node):
         """
         Return the name of the profile the specified node is using
         """
+        profile = self._profiles.profile(node)
+        if profile:
+            return profile.name
         config_parm = node.parm(self.PARM_CONFIG)
         return config_parm.menuLabels()[config_parm.eval()]
 
@@ -97,6 +295,314 @@ class ToolkitGeometryNodeHandler(object):
         """
         return self.__get_files_on_disk(node)
 
+    def get_frame_summary(self, node):
+        """
+        Returns the files on disk associated with this node together with a
+        summary dictionary of the frame range found on disk:
+        first, last, count, missing (frames) and total_bytes.
+        """
+        frames = self.__find_frames(node, restat=True)
+        if frames is None:
+            # not indexable, only the list of files is known
+            files = self.__get_files_on_disk(node)
+            summary = {'first': None,
+                       'last': None,
+                       'count': len(files),
+                       'missing': [],
+                       'total_bytes': sum(os.path.getsize(f) for f in files)}
+            return files, summary
+        return [f[1] for f in frames], summarize_frames(frames)
+
+    def get_disk_usage(self, nodes=None, workers=8):
+        """
+        Returns the disk usage report of the nodes, all nodes by default,
+        over all versions of their output found on disk, see disk_usage.
+        The files of all nodes are stat'ed in one pass on a pool of threads.
+
+        Versions are read from the work cache template, once per directory
+        when the version is part of the directory, once per file otherwise.
+        """
+        if nodes is None:
+            nodes = self.get_nodes()
+
+        outputs = []
+        for node in nodes:
+            try:
+                _, template, fields = self.__get_render_fields(
+                    node, "work_cache_template")
+            except Exception as err:
+                self._app.log_warning('{0}: {1}'.format(node.name(), err))
+                continue
+            paths = self._app.tank.paths_from_template(
+                template, fields, ["SEQ", "eye", "version"])
+            outputs.append((node, template, fields, paths))
+
+        all_paths = set()
+        for _, _, _, paths in outputs:
+            all_paths.update(paths)
+        stats = disk_usage.stat_files(all_paths, workers)
+
+        report = []
+        for node, template, fields, paths in outputs:
+            version_in_directory = \
+                "{version}" in template.definition.rsplit("/", 1)[0]
+            # directory or path -> version
+            versions = {}
+            files_by_version = {}
+            for path in paths:
+                if path not in stats:
+                    continue
+                key = os.path.dirname(path) if version_in_directory else path
+                if key not in versions:
+                    path_fields = match_fields(template, path)
+                    versions[key] = \
+                        path_fields.get("version") if path_fields else None
+                if versions[key] is not None:
+                    files_by_version.setdefault(versions[key], []).append(
+                        stats[path])
+
+            versions = []
+            for version, files in sorted(files_by_version.items()):
+                pattern = template.apply_fields(dict(fields, version=version))
+                pattern = pattern.replace(os.path.sep, "/")
+                versions.append(
+                    disk_usage.summarize_version(version, pattern, files))
+
+            report.append({'node': node.path(),
+                           'profile': self.get_node_profile_name(node),
+                           'total_bytes': sum(v['total_bytes']
+                                              for v in versions),
+                           'versions': versions})
+        return report
+
+    def write_disk_usage_report(self, report, path):
+        """
+        Writes a disk usage report as csv if path ends with .csv and as json
+        otherwise.
+        """
+        return disk_usage.write_report(report, path)
+
+    def get_prune_candidates(self, report, keep=2):
+        """
+        Returns the versions of a disk usage report that would be deleted
+        to keep the latest keep versions of each node. The version of the
+        current work file is always kept. Nothing is deleted.
+        """
+        work_file_fields = self.__get_hipfile_fields(
+            self._default_profile.templates["work_file_template"])
+        return disk_usage.prune_candidates(report, keep,
+                                           work_file_fields.get("version"))
+
+    def write_manifest(self, node):
+        """
+        Called at render or publish time.
+        Records the frames currently on disk for this node in the cache
+        manifest next to its output directory. Returns the manifest path.
+
+        Frames rewritten since the previous manifest, or not in it, are
+        recorded with the current fingerprint of the nodes upstream, the
+        others keep the fingerprint they were rendered with.
+        """
+        file_name, _, _ = self.__get_render_fields(node)
+        frames = self._frame_index.find(file_name, restat=True)
+        if frames is None:
+            msg = ("Can't write a manifest for node %s, its output path "
+                   "'%s' is not a frame sequence." % (node.name(), file_name))
+            raise sgtk.TankError(msg)
+
+        fingerprint = self.__get_upstream_fingerprint(node)
+        recorded = self.__get_recorded_upstream(file_name)
+        upstream = {}
+        for frame, _, _, mtime in frames:
+            recorded_mtime, recorded_fingerprint = \
+                recorded.get(frame, (None, None))
+            if recorded_mtime == mtime and recorded_fingerprint:
+                upstream[frame] = recorded_fingerprint
+            else:
+                upstream[frame] = fingerprint
+
+        return self._manifests.write(file_name, frames,
+                                     self.get_node_profile_name(node),
+                                     node.path(), upstream)
+
+    def read_manifest(self, node):
+        """
+        Returns the cache manifest entry of this node (pattern, profile,
+        first, last and frames as [frame, size, mtime, upstream]) or None if
+        there is no manifest or it is stale.
+        """
+        file_name, _, _ = self.__get_render_fields(node)
+        return self._manifests.read(file_name)
+
+    def verify_cache(self, node, workers=8):
+        """
+        Checks every frame of the node's frame range on a pool of worker
+        threads for existence, non-zero size, a readable header and
+        truncation.
+
+        Yields one dictionary per frame as the checks complete, with frame,
+        path, status, size and error. The status is 'ok', 'missing',
+        'empty', 'bad_header', 'unreadable', 'truncated' if the frame is
+        shorter than its header says or less than half the size of its
+        neighbouring frames, or 'unchecked' if no header rule applies to
+        the file type and only its size was checked. Frames found on disk
+        outside of the frame range are checked as well.
+        """
+        from .verify import minimum_sizes, verify_frames
+
+        # everything touching hou happens before the workers start
+        file_name, _, _ = self.__get_render_fields(node)
+        frames = self.__find_frames(node, restat=True)
+        if frames is None:
+            # not a sequence the index understands, check what is there
+            items = [(None, path) for path in self.__get_files_on_disk(node)]
+            return verify_frames(items, workers)
+
+        on_disk = dict((frame, path) for frame, path, _, _ in frames)
+        minimums = minimum_sizes(frames)
+        frame_range = self.__get_frame_range(node)
+
+        def items():
+            for frame in frame_range:
+                yield (frame, on_disk.pop(frame, None) or
+                       format_frame_path(file_name, frame),
+                       minimums.get(frame))
+            for frame in sorted(on_disk):
+                yield (frame, on_disk[frame], minimums.get(frame))
+
+        return verify_frames(items(), workers)
+
+    def get_dirty_frames(self, node):
+        """
+        Compares the frames on disk with the node's frame range.
+
+        A frame is missing if it doesn't exist or is empty, and stale if
+        its cache manifest records it was rendered with a different
+        fingerprint of the nodes upstream of this node than the current one.
+        Frames rewritten since the manifest was written, or not in it, were
+        rendered with the current upstream nodes and aren't stale.
+
+        Returns a dictionary with the missing and stale frames, the chunks
+        to re-render as (start, end, step) tuples and the current upstream
+        fingerprint.
+        """
+        file_name, _, _ = self.__get_render_fields(node)
+        frames = self._frame_index.find(file_name, restat=True)
+        if frames is None:
+            msg = ("Can't detect dirty frames for node %s, its output path "
+                   "'%s' is not a frame sequence." % (node.name(), file_name))
+            raise sgtk.TankError(msg)
+
+        on_disk = dict((frame, (size, mtime))
+                       for frame, _, size, mtime in frames)
+        fingerprint = self.__get_upstream_fingerprint(node)
+        recorded = self.__get_recorded_upstream(file_name)
+
+        missing = []
+        stale = []
+        frame_range = self.__get_frame_range(node)
+        for frame in frame_range:
+            size, mtime = on_disk.get(frame, (0, None))
+            recorded_mtime, recorded_fingerprint = \
+                recorded.get(frame, (None, None))
+            if not size:
+                missing.append(frame)
+            elif (recorded_mtime == mtime and recorded_fingerprint and
+                    recorded_fingerprint != fingerprint):
+                stale.append(frame)
+
+        step = frame_range[1] - frame_range[0] if len(frame_range) > 1 else 1
+        return {'missing': missing,
+                'stale': stale,
+                'chunks': contiguous_chunks(missing + stale, step),
+                'upstream_fingerprint': fingerprint}
+
+    def render_dirty_frames(self, node):
+        """
+        Renders only the missing and stale frames of the node (see
+        get_dirty_frames), one contiguous chunk at a time. Returns the
+        rendered chunks.
+
+        ROPs render each chunk without their inputs. SOPs can only render
+        their own frame range, which is rewritten for each chunk and then
+        restored with its keyframes and expressions.
+        """
+        chunks = self.get_dirty_frames(node)['chunks']
+        if not chunks:
+            return chunks
+
+        if node.type().category() == hou.ropNodeTypeCategory():
+            for start, end, step in chunks:
+                node.render(frame_range=(start, end, step),
+                            ignore_inputs=True)
+        else:
+            parms = [node.parm('trange')] + list(node.parmTuple('f'))
+            saved = [(parm.keyframes(), parm.eval()) for parm in parms]
+            try:
+                for parm in parms:
+                    parm.deleteAllKeyframes()
+                node.parm('trange').set(1)
+                for start, end, step in chunks:
+                    node.parmTuple('f').set((start, end, step))
+                    node.parm('execute').pressButton()
+            finally:
+                for parm, (keys, value) in zip(parms, saved):
+                    parm.deleteAllKeyframes()
+                    if keys:
+                        for key in keys:
+                            parm.setKeyframe(key)
+                    else:
+                        parm.set(value)
+
+        try:
+            self.write_manifest(node)
+        except Exception as err:
+            self._app.log_warning(err)
+
+        return chunks
+
+    def plan_farm_jobs(self, nodes=None, target_seconds=600, max_frames=None,
+                       bytes_per_second=None):
+        """
+        Plans the farm submission of the ROP nodes (all of them by default)
+        as a dependency graph of frame chunks, see farm.build_plan.
+
+        The render time per frame of each node is estimated from the frames
+        already on disk or in its cache manifest, and chunks are sized to
+        take about target_seconds. Nodes depend on the planned nodes
+        connected to their inputs, directly or through other nodes.
+        """
+        if nodes is None:
+            nodes = self.get_nodes('rop')
+        paths = set(node.path() for node in nodes)
+
+        entries = []
+        for node in nodes:
+            try:
+                frames = self.__find_frames(node, restat=True)
+            except Exception as err:
+                self._app.log_debug("No frames to estimate %s from: %s"
+                                    % (node.path(), err))
+                frames = None
+            seconds, estimate = farm.estimate_frame_seconds(
+                frames, bytes_per_second)
+
+            entries.append({
+                'node': node.path(),
+                'profile': self.get_node_profile_name(node),
+                'output': self.__get_render_path(node),
+                'depends_on': self.__get_input_dependencies(node, paths),
+                'frames': list(self.__get_frame_range(node)),
+                'frame_seconds': seconds,
+                'estimate': estimate})
+
+        try:
+            plan = farm.build_plan(entries, target_seconds, max_frames)
+        except ValueError as err:
+            raise sgtk.TankError(str(err))
+        plan['hip_file'] = hou.hipFile.path()
+        return plan
+
     def create_file_node(self):
         """
         Used by geometry_filein_button callback.
@@ -116,8 +622,82 @@ class ToolkitGeometryNodeHandler(object):
         # Move it away from the origin
         file_sop.moveToGoodPosition()
 
+    def create_file_nodes(self, nodes=None, packed=False):
+        """
+        Creates a file node reading the output of each of the nodes, all
+        nodes by default, in a single undo group.
+
+        Readers of SOP nodes are created next to them, readers of ROP nodes
+        in a new geo node in /obj. The readers of each network are laid out
+        on a grid below its existing nodes.
+
+        packed: Load the files as packed disk primitives, only read when
+                displayed or rendered, instead of loading all geometry.
+
+        Returns a dictionary with the created reader by node path and the
+        failed node paths with their errors.
+        """
+        if nodes is None:
+            nodes = self.get_nodes()
+        paths = self.compute_paths(nodes)
+
+        report = {'created': {}, 'failed': [], 'errors': {}}
+        readers = {}
+        container = None
+        with self.__batch_edits('Create file nodes', True):
+            for node in nodes:
+                node_path = node.path()
+                if node_path not in paths:
+                    report['failed'].append(node_path)
+                    report['errors'][node_path] = \
+                        'The output path could not be resolved.'
+                    continue
+
+                parent = node.parent()
+                if node.type().category() == hou.ropNodeTypeCategory():
+                    if container is None:
+                        container = hou.node('/obj').createNode(
+                            'geo', 'sgtk_geometry_readers',
+                            run_init_scripts=False)
+                        self.__layout_grid(container.parent(), [container])
+                    parent = container
+
+                file_sop = parent.createNode('file')
+                file_sop.parm('file').set(paths[node_path])
+                if packed:
+                    file_sop.parm('loadtype').set('delayed')
+                file_sop.setName('file_' + node.name(), unique_name=True)
+
+                readers.setdefault(parent.path(), (parent, []))[1].append(
+                    file_sop)
+                report['created'][node_path] = file_sop.path()
+
+            for parent, parent_readers in readers.values():
+                self.__layout_grid(parent, parent_readers)
+
+        return report
+
+    def get_selected_nodes(self):
+        """
+        Returns the selected sgtk nodes.
+        """
+        return [node for node in hou.selectedNodes()
+                if self._registry.node(node.path()) is not None]
+
+    def register_node(self, node):
+        """
+        Adds a new sgtk node to the nodes of the scene.
+        """
+        self._registry.register(node)
+
     def set_default_node_name(self, node):
-        name = self._app.get_setting('default_node_name')
+        # called from the OnCreated script of the OTLs
+        self.register_node(node)
+        for app in self._sibling_apps:
+            app.register_node(node)
+
+        profile = self._profiles.profile(node) or self._default_profile
+        name = profile.settings['default_node_name']
         return node.setName(name, unique_name=True)
 
     def create_output_path_menu(self):
@@ -132,18 +712,22 @@ class ToolkitGeometryNodeHandler(object):
 
         try:
             menu.append(self.compute_path(node))
-        except sgtk.TankError, err:
-            warn_err = '{0}: {1}'.format(node.name(), err)
-            self._app.log_warning(warn_err)
+        except sgtk.TankError as err:
+            self.__log_path_error(node, err)
             menu.append("ERROR: %s" % err)
 
         return menu
 
-    def convert_sg_to_geometry_nodes(self):
+    def convert_sg_to_geometry_nodes(self, defer_updates=True):
         """
         Utility function to convert all Shotgun Geometry nodes to regular
         Geometry nodes.
 
+        All edits are grouped into a single undo entry. If defer_updates is
+        set, Houdini's update mode is switched to manual while converting.
+
+        Returns a report dictionary, see __convert_nodes.
+
         # Example use:
         import sgtk
         eng = sgtk.platform.current_engine()
@@ -151,77 +735,34 @@ class ToolkitGeometryNodeHandler(object):
         # Convert Shotgun Geometry nodes to Geometry nodes:
         app.convert_to_geometry_nodes()
         """
+        # geometry operator to create, by category of the sgtk node
+        operators = {
+            hou.sopNodeTypeCategory().name(): 'rop_geometry',
+            hou.ropNodeTypeCategory().name(): 'geometry',
+        }
 
         # get sgtk geometry nodes:
-        sg_nodes = self.get_nodes()
-        for sg_n in sg_nodes:
-            try:
-                sop_types = hou.sopNodeTypeCategory().nodeTypes()
-                sop_type = sop_types[ToolkitGeometryNodeHandler.SG_NODE_CLASS]
-                rop_types = hou.ropNodeTypeCategory().nodeTypes()
-                rop_type = rop_types[ToolkitGeometryNodeHandler.SG_NODE_CLASS]
-                is_sop = sg_n.type() == sop_type
-                is_rop = sg_n.type() == rop_type
-
-                # set as selected:
-                node_name = sg_n.name()
-                node_pos = sg_n.position()
-
-                self._app.log_debug('Converting node: {0}'.format(sg_n.name()))
-                self._app.log_debug('path: {0}'.format(sg_n.path()))
-
-                # create new regular Geometry node:
-
-                if is_sop:
-                    geometry_operator = 'rop_geometry'
-                elif is_rop:
-                    geometry_operator = 'geometry'
-                else:
-                    continue
-
-                new_n = sg_n.parent().createNode(geometry_operator)
-
-                # copy across file parms:
-                filename = self.__get_menu_label(sg_n.parm('sopoutput'))
-                new_n.parm('sopoutput').set(filename)
-
-                # copy across any knob values from the internal geometry node.
-                # parmTuples
-                exclude = ['sopoutput']
-                self.__copy_parm_values(sg_n, new_n, exclude)
+        nodes = self.get_nodes()
+        connections = AdjacencyIndex(nodes)
 
-                # Store Toolkit specific information on geometry node
-                # so that we can reverse this process later
+        def convert(sg_n):
+            return self.__convert_sg_node(sg_n, operators, connections)
 
-                # Profile Name
-                new_n.setUserData('tk_profile_name',
-                                  self.get_node_profile_name(sg_n))
+        return self.__convert_nodes(nodes, convert,
+                                    'Convert SGTK Geometry nodes',
+                                    defer_updates)
 
-                # Copy inputs and move outputs
-                self.__copy_inputs_to_node(sg_n, new_n)
-                if is_rop:
-                    self.__move_outputs_to_node(sg_n, new_n)
-                elif is_sop:
-                    self.__move_outputs_from_node_to_user_data(sg_n, new_n)
-                self.__copy_color(sg_n, new_n)
-
-                # delete original node:
-                sg_n.destroy()
-
-                # rename new node:
-                new_n.setName(node_name)
-                new_n.setPosition(node_pos)
-            except Exception as err:
-                self._app.log_warning(err)
-                msg = 'Problems converting node: {0}'.format(sg_n.path())
-                self._app.log_warning(msg)
-
-    def convert_geometry_to_sg_nodes(self):
+    def convert_geometry_to_sg_nodes(self, defer_updates=True):
         """
         Utility function to convert all Geometry nodes to Shotgun
         Geometry nodes (only converts Geometry nodes that were previously
         Shotgun Geometry nodes)
 
+        All edits are grouped into a single undo entry. If defer_updates is
+        set, Houdini's update mode is switched to manual while converting.
+
+        Returns a report dictionary, see __convert_nodes.
+
         # Example use:
         import sgtk
         eng = sgtk.platform.current_engine()
@@ -237,57 +778,14 @@ class ToolkitGeometryNodeHandler(object):
         rop_nodes = hou.nodeType(hou.ropNodeTypeCategory(),
                                  'geometry').instances()
         nodes = sop_nodes + rop_nodes
-        for n in nodes:
-            try:
-                user_dict = n.userDataDict()
-
-                profile = user_dict.get('tk_profile_name')
-
-                if not profile:
-                    # can't convert to a Shotgun Geometry Node
-                    # as we have missing parameters!
-                    continue
-
-                # set as selected:
-                # wn.setSelected(True)
-                node_name = n.name()
-                node_pos = n.position()
-
-                self._app.log_debug('Converting node: {0}'.format(n.name()))
-                self._app.log_debug('path: {0}'.format(n.path()))
+        connections = AdjacencyIndex(nodes)
 
-                # create new Shotgun Geometry node:
-                node_class = ToolkitGeometryNodeHandler.SG_NODE_CLASS
-                new_sg_n = n.parent().createNode(node_class)
+        def convert(n):
+            return self.__convert_geometry_node(n, connections)
 
-                # set the profile
-                try:
-                    parm = new_sg_n.parm(ToolkitGeometryNodeHandler.PARM_CONFIG)
-                    index = parm.menuLabels().index(profile)
-                    parm.set(index)
-                except ValueError:
-                    pass
-
-                # copy across and knob values from the internal geometry node.
-                exclude = ['sopoutput']
-                self.__copy_parm_values(n, new_sg_n, exclude)
-
-                # Copy inputs and move outputs
-                self.__copy_inputs_to_node(n, new_sg_n)
-                self.__move_outputs_to_node(n, new_sg_n)
-                self.__move_outputs_from_user_data_to_node(n, new_sg_n)
-                self.__copy_color(n, new_sg_n)
-
-                # delete original node:
-                n.destroy()
-
-                # rename new node:
-                new_sg_n.setName(node_name)
-                new_sg_n.setPosition(node_pos)
-            except Exception as err:
-                self._app.log_warning(err)
-                msg = 'Problems converting node: {0}'.format(n.path())
-                self._app.log_warning(msg)
+        return self.__convert_nodes(nodes, convert,
+                                    'Convert Geometry nodes to SGTK',
+                                    defer_updates)
 
     ############################################################################
     # Public methods called from OTL - although these are public, they should
@@ -312,63 +810,485 @@ class ToolkitGeometryNodeHandler(object):
         Shows the location of the node in the file system.
         This is a callback which is executed when the show in fs
         button is pressed on the houdini output node.
+
+        The file system is only accessed on a worker thread, so slow mounts
+        don't block the UI, and the file browser is launched without
+        waiting for it.
         """
         node = hou.pwd()
         if not node:
             return
 
-        render_dir = None
+        from .show_in_fs import DirectoryLookup
 
-        # first, try to just use the current cached path:
+        # everything touching hou has to happen here, on the UI thread
         render_path = self.__get_render_path(node)
         if render_path:
             # the above method returns houdini style slashes, so ensure these
             # are pointing correctly
             render_path = render_path.replace("/", os.path.sep)
+        try:
+            render_fields = self.__get_render_fields(node)
+            fields_error = None
+        except Exception as e:
+            render_fields = None
+            fields_error = e
+
+        def lookup():
+            # first, try to just use the current cached path:
+            if render_path:
+                dir_name = os.path.dirname(render_path)
+                if os.path.exists(dir_name):
+                    return dir_name
 
-            dir_name = os.path.dirname(render_path)
-            if os.path.exists(dir_name):
-                render_dir = dir_name
-
-        if not render_dir:
             # render directory doesn't exist so try using location
             # of rendered frames instead:
-            try:
-                files = self.get_files_on_disk(node)
-                if len(files) == 0:
-                    msg = ("There are no renders for this node yet!\n"
-                           "When you render, the files will be written to "
-                           "the following location:\n\n%s" % render_path)
-                    hou.ui.displayMessage(msg)
-                else:
-                    render_dir = os.path.dirname(files[0])
-            except Exception, e:
-                msg = ("Unable to jump to file system:\n\n%s" % e)
-                hou.ui.displayMessage(msg)
-
-        # if we have a valid render path then show it:
-        if render_dir:
-            system = sys.platform
-
-            # run the app
-            if system == "linux2":
-                cmd = "xdg-open \"%s\"" % render_dir
-            elif system == "darwin":
-                cmd = "open '%s'" % render_dir
-            elif system == "win32":
-                cmd = "cmd.exe /C start \"Folder\" \"%s\"" % render_dir
-            else:
-                raise Exception("Platform '%s' is not supported." % system)
+            if fields_error:
+                raise fields_error
+            files = self.__get_files_from_fields(*render_fields)
+            if files:
+                return os.path.dirname(files[0])
+            return None
 
-            self._app.log_debug("Executing command '%s'" % cmd)
-            exit_code = os.system(cmd)
-            if exit_code != 0:
-                msg = ("Failed to launch '%s'!" % cmd)
-                hou.ui.displayMessage(msg)
+        if self._fs_lookup:
+            self._fs_lookup.cancel()
+        self._fs_lookup = DirectoryLookup(lookup)
+        self._fs_lookup.start(
+            lambda render_dir, error: self.__show_in_fs(render_dir, error,
+                                                        render_path))
 
     ############################################################################
     # Private methods
 
+    def __show_in_fs(self, render_dir, error, render_path):
+        """
+        Opens render_dir in the file browser once the lookup started by
+        on_show_in_fs_button_callback is done.
+        """
+        self._fs_lookup = None
+
+        if error:
+            msg = ("Unable to jump to file system:\n\n%s" % error)
+            hou.ui.displayMessage(msg)
+            return
+
+        if not render_dir:
+            msg = ("There are no renders for this node yet!\n"
+                   "When you render, the files will be written to "
+                   "the following location:\n\n%s" % render_path)
+            hou.ui.displayMessage(msg)
+            return
+
+        from .show_in_fs import launch_file_browser
+
+        try:
+            cmd = launch_file_browser(render_dir)
+            self._app.log_debug("Executed command '%s'" % " ".join(cmd))
+        except OSError as e:
+            msg = ("Failed to launch the file browser for '%s'!\n\n%s"
+                   % (render_dir, e))
+            hou.ui.displayMessage(msg)
+
+    def __scan_nodes(self):
+        """
+        Returns all sgtk nodes of the scene
+        """
+        node_class = ToolkitGeometryNodeHandler.SG_NODE_CLASS
+        return (list(hou.nodeType(hou.sopNodeTypeCategory(),
+                                  node_class).instances()) +
+                list(hou.nodeType(hou.ropNodeTypeCategory(),
+                                  node_class).instances()))
+
+    def __build_path(self, node, template, camera, work_file_fields,
+                     context_fields):
+        """
+        Resolves the output path of the node from the scene fields
+        """
+        # create fields dict with all the metadata
+        fields = {}
+        fields["name"] = work_file_fields.get("name")
+        fields["version"] = work_file_fields["version"]
+        fields["renderpass"] = node.name()
+        fields["SEQ"] = "FORMAT: $F"
+
+        if camera:
+            fields["width"] = camera[1]
+            fields["height"] = camera[2]
+
+        fields.update(context_fields)
+
+        path = template.apply_fields(fields)
+        path = path.replace(os.path.sep, "/")
+
+        return path
+
+    def __get_scene_fields(self, node, template, context_key):
+        """
+        Returns the hip file fields and the context fields shared by all
+        nodes of the scene using the profile of the node.
+        """
+        # Get relevant fields from the scene filename and contents
+        work_file_fields = self.__get_hipfile_fields(
+            self.__get_template(node, "work_file_template"))
+        if not work_file_fields:
+            msg = "This Houdini file is not a Shotgun Toolkit work file!"
+            raise sgtk.TankError(msg)
+
+        context_fields = self.__get_context_fields(template, context_key)
+
+        return work_file_fields, context_fields
+
+    def __get_context_fields(self, template, context_key):
+        """
+        Returns the context fields of the template, resolved once per
+        template and context. Don't modify them.
+        """
+        key = (id(template), context_key)
+        cached = self._context_fields.get(key)
+        if cached is not None and cached[0] is template:
+            return cached[1]
+        fields = self._app.context.as_template_fields(template)
+        self._context_fields[key] = (template, fields)
+        return fields
+
+    def __get_path_cache_key(self, node, camera, hip_path, context_key):
+        return (hip_path, node.name(), self.get_node_profile_name(node),
+                camera, context_key)
+
+    def __get_path_fingerprint(self, node, key, template):
+        """
+        Returns a hash of everything the output path depends on that stays
+        the same between Houdini sessions and machines: the path cache key
+        without the camera session id and the context, the context fields
+        of the template and the definitions of the templates.
+        """
+        hip_path, node_name, profile, camera, context_key = key
+        resolution = camera[1:] if camera else None
+        context_fields = sorted(
+            self.__get_context_fields(template, context_key).items())
+        work_file_template = self.__get_template(node, "work_file_template")
+        values = (hip_path, node_name, profile, resolution, context_fields,
+                  template.definition,
+                  work_file_template.definition if work_file_template
+                  else None)
+        return hashlib.sha1(repr(values).encode('utf-8')).hexdigest()
+
+    def __get_stored_path(self, node, key, template):
+        """
+        Returns the path stored on the node when the scene was saved, if
+        storing paths is enabled and it was resolved from the same inputs.
+        """
+        if not self._store_paths:
+            return None
+        try:
+            stored = self._get_compressed_json(node, 'tk_resolved_path')
+            fingerprint = stored['fingerprint'] if stored else None
+            path = stored['path'] if stored else None
+        except Exception as err:
+            # anything that can't be decoded is a miss
+            self._app.log_debug("Ignoring the path stored on %s: %s"
+                                % (node.path(), err))
+            return None
+        if fingerprint and fingerprint == \
+                self.__get_path_fingerprint(node, key, template):
+            return path
+        return None
+
+    def __store_resolved_paths(self):
+        """
+        Stores the resolved output path of the nodes of this instance's
+        profile with its fingerprint on the node, so it doesn't need
+        resolving when the scene is loaded again. Every instance handles
+        its own nodes.
+        """
+        hip_path = hou.hipFile.path()
+        context_key = repr(self._app.context)
+        nodes = []
+        for node in self.get_nodes():
+            profile = self._profiles.profile(node)
+            if profile and profile.instance_name == self._app.instance_name:
+                nodes.append(node)
+
+        paths = self.compute_paths(nodes)
+        for node in nodes:
+            path = paths.get(node.path())
+            if path is None:
+                continue
+            template = self.__get_template(node, "work_cache_template")
+            camera = self.__get_camera_resolution(node, template)
+            key = self.__get_path_cache_key(node, camera, hip_path,
+                                            context_key)
+            self._set_compressed_json(node, 'tk_resolved_path', {
+                'path': path,
+                'fingerprint': self.__get_path_fingerprint(node, key,
+                                                           template)})
+
+    def __cache_path(self, key, path, node, camera):
+        camera_id = camera[0] if camera else None
+        self._path_cache.set(key, path, node.sessionId(), camera_id)
+        self.__watch_node(node)
+
+    def __get_camera_resolution(self, node, template):
+        """
+        Returns (camera session id, resx, resy) if the template needs the
+        camera width and height, None otherwise.
+        """
+        if "width" not in template.keys and "height" not in template.keys:
+            return None
+
+        cam_path = node.parm("geometry1_camera").eval()
+        try:
+            return self._cameras.get(cam_path)
+        except CameraNotFound as err:
+            if self._cameras.report_missing(cam_path):
+                self._app.log_warning('{0}: {1}'.format(node.name(), err))
+            raise
+
+    def __log_path_error(self, node, err):
+        """
+        Logs why the output path of the node can't be resolved. Missing
+        cameras are reported when first found missing only.
+        """
+        if not isinstance(err, CameraNotFound):
+            self._app.log_warning('{0}: {1}'.format(node.name(), err))
+
+    def __watch_node(self, node):
+        node_id = node.sessionId()
+        if node_id in self._watched_nodes:
+            return
+        node.addEventCallback((hou.nodeEventType.NameChanged,
+                               hou.nodeEventType.BeingDeleted),
+                              self.__on_node_event)
+        self._watched_nodes.add(node_id)
+
+    def __unwatch_all(self):
+        for node_id in self._watched_nodes:
+            node = hou.nodeBySessionId(node_id)
+            if node:
+                node.removeEventCallback((hou.nodeEventType.NameChanged,
+                                          hou.nodeEventType.BeingDeleted),
+                                         self.__on_node_event)
+        self._cameras.clear()
+        self._watched_nodes.clear()
+        self._path_cache.invalidate()
+
+    def __on_hip_file_event(self, event_type):
+        if event_type in (hou.hipFileEventType.AfterClear,
+                          hou.hipFileEventType.AfterLoad):
+            # all nodes are gone, so are their callbacks
+            self._watched_nodes.clear()
+            self._cameras.clear(unwatch=False)
+            self._path_cache.invalidate()
+            self._context_fields.clear()
+            self._frame_index.invalidate()
+            self._registry.invalidate()
+        elif event_type == hou.hipFileEventType.AfterMerge:
+            self._path_cache.invalidate()
+            self._registry.invalidate()
+        elif event_type == hou.hipFileEventType.BeforeSave:
+            if self._store_paths:
+                try:
+                    self.__store_resolved_paths()
+                except Exception as err:
+                    self._app.log_warning(
+                        "Could not store the output paths: {0}".format(err))
+        elif event_type == hou.hipFileEventType.AfterSave:
+            self._path_cache.invalidate()
+
+    def __on_node_event(self, event_type, **kwargs):
+        node_id = kwargs['node'].sessionId()
+        self._path_cache.invalidate_node(node_id)
+        if event_type == hou.nodeEventType.BeingDeleted:
+            self._watched_nodes.discard(node_id)
+
+    def __convert_nodes(self, nodes, convert, label, defer_updates):
+        """
+        Runs convert on each of the nodes inside a single undo group.
+
+        convert: Callable converting a single node. Returns False if the
+                 node was skipped.
+
+        Returns a dictionary with the paths of the converted, skipped and
+        failed nodes, the error of each failed node and the timings (in
+        seconds) of the whole conversion and of each node.
+        """
+        report = {'converted': [],
+                  'skipped': [],
+                  'failed': [],
+                  'errors': {},
+                  'timings': {'total': 0.0, 'nodes': {}}}
+
+        start = time.time()
+        with self.__batch_edits(label, defer_updates):
+            for node in nodes:
+                node_path = node.path()
+                node_start = time.time()
+                try:
+                    if convert(node) is False:
+                        report['skipped'].append(node_path)
+                    else:
+                        report['converted'].append(node_path)
+                except Exception as err:
+                    self._app.log_warning(err)
+                    msg = 'Problems converting node: {0}'.format(node_path)
+                    self._app.log_warning(msg)
+                    report['failed'].append(node_path)
+                    report['errors'][node_path] = str(err)
+                duration = time.time() - node_start
+                report['timings']['nodes'][node_path] = duration
+                if self._instrumentation:
+                    self._instrumentation.record('convert_node', node_path,
+                                                 duration)
+        report['timings']['total'] = time.time() - start
+
+        return report
+
+    @contextlib.contextmanager
+    def __batch_edits(self, label, defer_updates):
+        """
+        Groups all edits made in the block into a single undo entry and
+        optionally defers cooking until the block is left.
+        """
+        update_mode = None
+        if defer_updates:
+            update_mode = hou.updateModeSetting()
+            hou.setUpdateMode(hou.updateMode.Manual)
+        try:
+            with hou.undos.group(label):
+                yield
+        finally:
+            if update_mode is not None:
+                hou.setUpdateMode(update_mode)
+
+    def __convert_sg_node(self, sg_n, operators, connections):
+        """
+        Replaces a Shotgun Geometry node by a regular Geometry node.
+
+        operators: Dictionary of node type category name -> geometry
+                   operator name.
+        connections: AdjacencyIndex of the networks of the converted nodes.
+        """
+        node_type = sg_n.type()
+        if node_type.name() != ToolkitGeometryNodeHandler.SG_NODE_CLASS:
+            return False
+        geometry_operator = operators.get(node_type.category().name())
+        if not geometry_operator:
+            return False
+        is_rop = geometry_operator == 'geometry'
+
+        node_name = sg_n.name()
+        node_pos = sg_n.position()
+
+        self._app.log_debug('Converting node: {0}'.format(sg_n.name()))
+        self._app.log_debug('path: {0}'.format(sg_n.path()))
+
+        # create new regular Geometry node:
+        new_n = sg_n.parent().createNode(geometry_operator)
+
+        # copy across file parms:
+        filename = self.__get_menu_label(sg_n.parm('sopoutput'))
+        new_n.parm('sopoutput').set(filename)
+
+        # copy across any knob values from the internal geometry node.
+        # parmTuples
+        exclude = ['sopoutput']
+        self.__copy_parm_values(sg_n, new_n, exclude)
+
+        # Store Toolkit specific information on geometry node
+        # so that we can reverse this process later
+
+        # Profile Name
+        new_n.setUserData('tk_profile_name',
+                          self.get_node_profile_name(sg_n))
+
+        # Copy inputs and move outputs
+        self.__copy_inputs_to_node(sg_n, new_n, connections)
+        if is_rop:
+            self.__move_outputs_to_node(sg_n, new_n, connections)
+        else:
+            self.__move_outputs_from_node_to_user_data(sg_n, new_n,
+                                                       connections)
+        self.__copy_color(sg_n, new_n)
+        connections.replace(sg_n, new_n)
+
+        # delete original node:
+        sg_n.destroy()
+
+        # rename new node:
+        new_n.setName(node_name)
+        new_n.setPosition(node_pos)
+
+    def __convert_geometry_node(self, n, connections):
+        """
+        Replaces a previously converted Geometry node by a Shotgun Geometry
+        node.
+
+        connections: AdjacencyIndex of the networks of the converted nodes.
+        """
+        user_dict = n.userDataDict()
+
+        profile = user_dict.get('tk_profile_name')
+
+        if not profile:
+            # can't convert to a Shotgun Geometry Node
+            # as we have missing parameters!
+            return False
+
+        node_name = n.name()
+        node_pos = n.position()
+
+        self._app.log_debug('Converting node: {0}'.format(n.name()))
+        self._app.log_debug('path: {0}'.format(n.path()))
+
+        # create new Shotgun Geometry node:
+        node_class = ToolkitGeometryNodeHandler.SG_NODE_CLASS
+        new_sg_n = n.parent().createNode(node_class)
+
+        # set the profile
+        try:
+            parm = new_sg_n.parm(ToolkitGeometryNodeHandler.PARM_CONFIG)
+            index = parm.menuLabels().index(profile)
+            parm.set(index)
+        except ValueError:
+            pass
+
+        # copy across and knob values from the internal geometry node.
+        exclude = ['sopoutput']
+        self.__copy_parm_values(n, new_sg_n, exclude)
+
+        # Copy inputs and move outputs
+        self.__copy_inputs_to_node(n, new_sg_n, connections)
+        self.__move_outputs_to_node(n, new_sg_n, connections)
+        self.__move_outputs_from_user_data_to_node(n, new_sg_n, connections)
+        self.__copy_color(n, new_sg_n)
+        connections.replace(n, new_sg_n)
+
+        # delete original node:
+        n.destroy()
+
+        # rename new node:
+        new_sg_n.setName(node_name)
+        new_sg_n.setPosition(node_pos)
+
+    def __layout_grid(self, parent, nodes):
+        """
+        Places the nodes on a square grid below the other children of the
+        parent.
+        """
+        node_ids = set(node.sessionId() for node in nodes)
+        positions = [child.position() for child in parent.children()
+                     if child.sessionId() not in node_ids]
+        left = min([p[0] for p in positions] or [0.0])
+        top = 0.0
+        if positions:
+            top = min(p[1] for p in positions) - self.GRID_SPACING[1]
+
+        columns = int(math.ceil(math.sqrt(len(nodes))))
+        for index, node in enumerate(nodes):
+            row, column = divmod(index, columns)
+            node.setPosition((left + column * self.GRID_SPACING[0],
+                              top - row * self.GRID_SPACING[1]))
+
     def __copy_color(self, node_a, node_b):
         color_a = node_a.color()
         node_b.setColor(color_a)
@@ -382,18 +1302,62 @@ class ToolkitGeometryNodeHandler(object):
         else:
             return parm.menuItems()[parm.eval()]
 
-    def __get_hipfile_fields(self):
+    def __get_frame_range(self, node):
+        """
+        Returns the frames rendered by the node according to its frame range
+        parms.
+        """
+        if node.parm('trange').eval() == 0:
+            # render current frame
+            return [int(hou.frame())]
+
+        start, end, step = node.parmTuple('f').eval()
+        step = max(1, int(step))
+        return range(int(start), int(end) + 1, step)
+
+    def __get_recorded_upstream(self, file_name):
+        """
+        Returns frame -> (mtime, upstream fingerprint) of the frames of the
+        sequence recorded in its manifest, stale or not.
+        """
+        entry = self._manifests.read(file_name, allow_stale=True)
+        if not entry:
+            return {}
+        return dict((frame[0], (frame[2], frame[3]))
+                    for frame in entry['frames'] if len(frame) > 3)
+
+    def __get_upstream_fingerprint(self, node):
+        """
+        Returns a hash of the path, type and raw parm values of every node
+        the output of this node depends on.
+        """
+        upstream = list(node.inputAncestors())
+        soppath = node.parm('soppath')
+        if soppath:
+            sop = node.node(soppath.eval())
+            if sop:
+                upstream += [sop] + list(sop.inputAncestors())
+
+        digest = hashlib.sha1()
+        for upstream_node in sorted(upstream, key=lambda n: n.path()):
+            values = [upstream_node.path(), upstream_node.type().name()]
+            values += ['%s=%s' % (p.name(), p.rawValue())
+                       for p in upstream_node.parms()]
+            digest.update('\n'.join(values).encode('utf-8'))
+        return digest.hexdigest()
+
+    def __get_hipfile_fields(self, work_file_template):
         """
         Extract fields from the current Houdini file using the template
         """
         curr_filename = hou.hipFile.path()
 
-        work_fields = {}
-        if self._work_file_template \
-                and self._work_file_template.validate(curr_filename):
-            work_fields = self._work_file_template.get_fields(curr_filename)
+        work_fields = None
+        if work_file_template:
+            work_fields = self._template_matcher.fields(work_file_template,
+                                                        curr_filename)
 
-        return work_fields
+        return work_fields or {}
 
     def __get_render_path(self, node):
         output_parm = node.parm(self.PARM_OUTPUT_PATH)
@@ -410,115 +1374,230 @@ class ToolkitGeometryNodeHandler(object):
         """
         Get the named template for the specified node.
         """
-        return self._app.get_template(name)
+        profile = self._profiles.profile(node) or self._default_profile
+        return profile.templates[name]
 
     def __get_files_on_disk(self, node):
         """
         Called from render publisher & UI (via exists_on_disk)
         Returns the files on disk associated with this node
         """
+        return self.__get_files_from_fields(*self.__get_render_fields(node))
+
+    def __get_files_from_fields(self, file_name, template, fields):
+        """
+        Returns the files on disk matching the render path and its fields.
+        Doesn't touch hou, so it's safe to call from worker threads.
+        """
+        frames = self.__get_frames_from_fields(file_name)
+        if frames is not None:
+            return [f[1] for f in frames]
+
+        # make sure we don't look for any eye - %V or SEQ - %04d stuff
+        frames = self._app.tank.paths_from_template(template, fields,
+                                                    ["SEQ", "eye"])
+        return frames
+
+    def __find_frames(self, node, restat=False):
+        """
+        Returns the (frame, path, size, mtime) entries of the frames on disk
+        from the frame index, or None if the output path can't be indexed.
+        """
+        file_name, _, _ = self.__get_render_fields(node)
+        return self.__get_frames_from_fields(file_name, restat)
+
+    def __get_frames_from_fields(self, file_name, restat=False):
+        """
+        Returns the (frame, path, size, mtime) entries of the frames on disk
+        from a valid cached listing, the cache manifest or a new listing, in
+        that order. None if the output path can't be indexed.
+
+        restat: If True, sizes and mtimes are current even for frames
+                rewritten in place since they were listed.
+        """
+        frames = self._frame_index.find(file_name, scan=False, restat=restat)
+        if frames is None:
+            frames = self._manifests.read_frames(file_name, restat=restat)
+        if frames is None:
+            frames = self._frame_index.find(file_name, restat=restat)
+        return frames
+
+    def __get_render_fields(self, node, template_name=None):
+        """
+        Returns the render path of the node, its render template, or the
+        named template, and the fields of the path.
+        """
         file_name = self.__get_render_path(node)
-        template = self.__get_render_template(node)
+        if template_name is None:
+            template = self.__get_render_template(node)
+        else:
+            template = self.__get_template(node, template_name)
 
-        if not template.validate(file_name):
+        fields = self._template_matcher.fields(template, file_name)
+        if fields is None:
             msg = ("Could not resolve the files on disk for node %s."
                    "The path '%s' is not recognized by Shotgun!"
                    % (node.name(), file_name))
             raise Exception(msg)
 
-        fields = template.get_fields(file_name)
-
-        # make sure we don't look for any eye - %V or SEQ - %04d stuff
-        frames = self._app.tank.paths_from_template(template, fields,
-                                                    ["SEQ", "eye"])
-        return frames
+        return file_name, template, fields
 
     def __copy_parm_values(self, source_node, target_node, exclude=None):
         """
         Copy parameter values of the source node to those of the target node
         if a parameter with the same name exists.
         """
-        exclude = exclude if exclude else []
-        parms = [p for p in source_node.parms() if p.name() not in exclude]
-        for parm_to_copy in parms:
-
-            parm_template = parm_to_copy.parmTemplate()
-            # Skip folder parms.
-            if isinstance(parm_template, hou.FolderSetParmTemplate):
+        plan = self.__get_copy_plan(source_node, target_node, exclude)
+        for name, is_string in plan:
+            tuple_to_copy = source_node.parmTuple(name)
+            tuple_to_copy_to = target_node.parmTuple(name)
+            if tuple_to_copy is None or tuple_to_copy_to is None:
                 continue
 
-            parm_to_copy_to = target_node.parm(parm_to_copy.name())
-            # If the parm on the target node does not exist, skip this parm.
-            if parm_to_copy_to is None:
+            keyframes = [p.keyframes() for p in tuple_to_copy]
+            if not any(keyframes):
+                # Copy the whole tuple at once. If the parameter is a string
+                # copy the raw string, otherwise the raw value.
+                if is_string:
+                    tuple_to_copy_to.set([p.unexpandedString()
+                                          for p in tuple_to_copy])
+                else:
+                    tuple_to_copy_to.set(tuple_to_copy.eval())
                 continue
 
             # If we have keys/expressions we need to copy them all.
-            if parm_to_copy.keyframes():
-                # Copy all hou.Keyframe objects.
-                for key in parm_to_copy.keyframes():
-                    parm_to_copy_to.setKeyframe(key)
-            else:
-                # If the parameter is a string copy the raw string.
-                if isinstance(parm_template, hou.StringParmTemplate):
+            for parm_to_copy, parm_to_copy_to, keys in zip(
+                    tuple_to_copy, tuple_to_copy_to, keyframes):
+                if keys:
+                    # Copy all hou.Keyframe objects.
+                    for key in keys:
+                        parm_to_copy_to.setKeyframe(key)
+                elif is_string:
                     parm_to_copy_to.set(parm_to_copy.unexpandedString())
-                # Copy the raw value.
                 else:
                     parm_to_copy_to.set(parm_to_copy.eval())
 
-    def __copy_inputs_to_node(self, node, target, ignore_missing=False):
+    def __get_copy_plan(self, source_node, target_node, exclude=None):
+        """
+        Returns the list of (parm tuple name, is string) of all parm tuples
+        the source and target node types have in common.
+
+        Plans are built once per pair of node types and excluded names.
+        """
+        exclude = tuple(sorted(exclude)) if exclude else ()
+        source_type = source_node.type()
+        target_type = target_node.type()
+        key = (source_type.category().name(), source_type.name(),
+               target_type.category().name(), target_type.name(),
+               exclude)
+
+        plan = self._copy_plans.get(key)
+        if plan is not None:
+            return plan
+
+        target_names = set(t.name() for t in target_node.parmTuples())
+        plan = []
+        for parm_tuple in source_node.parmTuples():
+            name = parm_tuple.name()
+            if name in exclude or name not in target_names:
+                continue
+
+            parm_template = parm_tuple.parmTemplate()
+            # Skip folder parms.
+            if isinstance(parm_template, hou.FolderSetParmTemplate):
+                continue
+
+            is_string = isinstance(parm_template, hou.StringParmTemplate)
+            plan.append((name, is_string))
+
+        plan = tuple(plan)
+        self._copy_plans[key] = plan
+        return plan
+
+    def __copy_inputs_to_node(self, node, target, connections,
+                              ignore_missing=False):
         """ Copy all the input connections from this node to the
             target node.
 
+            connections: AdjacencyIndex the connections are taken from.
             ignore_missing: If the target node does not have enough
                             inputs then skip this connection.
         """
-        input_connections = node.inputConnections()
+        input_connections = connections.inputs(node)
 
         num_target_inputs = len(target.inputConnectors())
-        if num_target_inputs is 0:
+        if num_target_inputs == 0:
             raise hou.OperationFailed("Target node has no inputs.")
 
-        for connection in input_connections:
-            index = connection.inputIndex()
+        for index, input_node in input_connections:
             if index > (num_target_inputs - 1):
                 if ignore_missing:
                     continue
                 else:
                     raise hou.InvalidInput("Target node has too few inputs.")
 
-            target.setInput(index, connection.inputNode())
+            target.setInput(index, input_node)
+
+    def __get_input_dependencies(self, node, paths):
+        """
+        Returns the paths in paths of the nodes connected to the inputs of
+        the node, walking through the connected nodes not in paths.
+        """
+        dependencies = []
+        visited = set()
+        pending = [c.inputNode() for c in node.inputConnections()]
+        while pending:
+            input_node = pending.pop(0)
+            if input_node is None or input_node.path() in visited:
+                continue
+            visited.add(input_node.path())
+            if input_node.path() in paths:
+                dependencies.append(input_node.path())
+            else:
+                pending += [c.inputNode()
+                            for c in input_node.inputConnections()]
+        return dependencies
 
-    def __move_outputs_to_node(self, node, target):
+    def __move_outputs_to_node(self, node, target, connections):
         """ Move all the output connections from this node to the
             target node.
-        """
-        output_connections = node.outputConnections()
 
-        for connection in output_connections:
-            node = connection.outputNode()
-            node.setInput(connection.inputIndex(), target)
+            connections: AdjacencyIndex the connections are taken from.
+        """
+        for output_node, index in connections.outputs(node):
+            output_node.setInput(index, target)
 
-    def __move_outputs_from_node_to_user_data(self, node, target):
+    def __move_outputs_from_node_to_user_data(self, node, target,
+                                              connections):
         """Saves output connections into user data of target node.
         Needed when target node doesn't have outputs.
+
+        Downstream nodes are stored by path and by session id, which
+        survives renames within the same Houdini session.
         """
-        output_connections = node.outputConnections()
+        output_connections = connections.outputs(node)
 
         if not output_connections:
             return
 
         outputs = []
-        for connection in output_connections:
+        for output_node, index in output_connections:
             output_dict = {}
-            output_dict['node'] = connection.outputNode().path()
-            output_dict['input'] = connection.inputIndex()
+            output_dict['node'] = output_node.path()
+            output_dict['input'] = index
+            output_dict['session_id'] = output_node.sessionId()
+            output_dict['session'] = SESSION
             outputs.append(output_dict)
 
         self._set_compressed_json(target, 'tk_output_connections', outputs)
 
-    def __move_outputs_from_user_data_to_node(self, node, target):
+    def __move_outputs_from_user_data_to_node(self, node, target,
+                                              connections):
         """ Move all the output connections from this node to the
             target node.
+
+            Downstream nodes are looked up by session id if they were
+            stored in this Houdini session, by path otherwise.
         """
         outputs = self._get_compressed_json(node, 'tk_output_connections')
 
@@ -526,8 +1605,16 @@ class ToolkitGeometryNodeHandler(object):
             return
 
         for connection in outputs:
-            node = hou.node(connection['node'])
-            node.setInput(connection['input'], target)
+            output_node = None
+            if connection.get('session') == SESSION:
+                output_node = connections.resolve(connection['session_id'])
+            if output_node is None:
+                output_node = hou.node(connection['node'])
+            if output_node is None:
+                msg = "Output node {0} not found.".format(connection['node'])
+                self._app.log_warning(msg)
+                continue
+            output_node.setInput(connection['input'], target)
 
     def _set_compressed_json(self, node, key, data):
         """Save python structures (like list or dictionary) as json string in
@@ -535,10 +1622,7 @@ class ToolkitGeometryNodeHandler(object):
         """
         self._app.log_debug(node)
 
-        data = pickle.dumps(data)
-        data_string = 'sgtk-01:' + base64.b64encode(zlib.compress(data))
-
-        node.setUserData(key, data_string)
+        node.setUserData(key, user_data.encode(data))
 
     def _get_compressed_json(self, node, key):
         """Returns the python structure from a decompressed json string.
@@ -548,5 +1632,4 @@ class ToolkitGeometryNodeHandler(object):
         str_data = node.userData(key)
         if str_data is None:
             return None
-        str_ = zlib.decompress(base64.b64decode(str_data[7:]))
-        return pickle.loads(str_)
+        return user_data.decode(str_data)
@@ -0,0 +1,98 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+import functools
+import time
+from collections import deque
+
+
+class Instrumentation(object):
+    """
+    Call counters and latencies of instrumented callables.
+
+    Totals are kept for every call, the latest calls are kept in a ring
+    buffer of the given capacity and used for percentiles and the per node
+    breakdown.
+    """
+
+    def __init__(self, capacity=1000):
+        # name -> [count, total seconds]
+        self._totals = {}
+        # (name, node path, seconds)
+        self._records = deque(maxlen=capacity)
+
+    def wrap(self, name, func, get_node_path=None):
+        """
+        Returns func wrapped to record each call under name.
+
+        get_node_path: Optional callable returning the path of the node the
+                       call is about.
+        """
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                duration = time.time() - start
+                node_path = None
+                if get_node_path:
+                    try:
+                        node_path = get_node_path()
+                    except Exception:
+                        pass
+                self.record(name, node_path, duration)
+        return wrapper
+
+    def record(self, name, node_path, duration):
+        """
+        Records a single call.
+        """
+        totals = self._totals.setdefault(name, [0, 0.0])
+        totals[0] += 1
+        totals[1] += duration
+        self._records.append((name, node_path, duration))
+
+    def reset(self):
+        self._totals.clear()
+        self._records.clear()
+
+    def report(self):
+        """
+        Returns a dictionary of name -> statistics: count, total_ms,
+        mean_ms, p95_ms and nodes (node path -> count, total_ms). The p95
+        and node breakdown only cover the calls still in the ring buffer.
+        """
+        durations = {}
+        nodes = {}
+        for name, node_path, duration in self._records:
+            durations.setdefault(name, []).append(duration)
+            if node_path:
+                node = nodes.setdefault(name, {}).setdefault(
+                    node_path, {'count': 0, 'total_ms': 0.0})
+                node['count'] += 1
+                node['total_ms'] += duration * 1000.0
+
+        report = {}
+        for name, (count, total) in self._totals.items():
+            report[name] = {'count': count,
+                            'total_ms': total * 1000.0,
+                            'mean_ms': total * 1000.0 / count,
+                            'p95_ms': _percentile(durations.get(name), 0.95),
+                            'nodes': nodes.get(name, {})}
+        return report
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index] * 1000.0
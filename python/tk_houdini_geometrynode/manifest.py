@@ -0,0 +1,166 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+"""
+Cache manifests written next to output directories.
+
+The manifest of '<parent>/<directory>' is '<parent>/<directory>' +
+MANIFEST_SUFFIX. Living outside of the directory, writing it doesn't change
+the directory mtime, which is what entries are checked against: an entry is
+stale as soon as a file was added to, removed from or renamed in the
+directory after it was written. Each frame also records the fingerprint
+of the nodes upstream of the node it was rendered with, null if unknown.
+
+    {"version": 1,
+     "sequences": {"<file name pattern>": {
+         "pattern": "<output path>",
+         "profile": "<profile name>",
+         "node": "<node path>",
+         "directory_mtime": <mtime>,
+         "written": <time>,
+         "first": <frame>, "last": <frame>,
+         "frames": [[<frame>, <size>, <mtime>, <upstream>], ...]}}}
+"""
+
+import json
+import os
+import threading
+import time
+
+from .frame_index import format_frame_path, restat_frames
+
+MANIFEST_SUFFIX = '.sgtk_manifest.json'
+MANIFEST_VERSION = 1
+
+
+def manifest_path(directory):
+    """
+    Returns the path of the manifest of an output directory.
+    """
+    return os.path.normpath(directory) + MANIFEST_SUFFIX
+
+
+class ManifestStore(object):
+    """
+    Reads and writes manifests, keeping the parsed ones until the manifest
+    file changes. Parsed manifests are shared and never modified, writing
+    builds a new one. Reads may run on worker threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # manifest path -> (manifest mtime, manifest)
+        self._manifests = {}
+
+    def read(self, file_name, allow_stale=False):
+        """
+        Returns the manifest entry of the sequence file_name, or None if
+        there is none or, unless allow_stale is set, it is stale.
+        """
+        directory, base_name = os.path.split(file_name)
+        try:
+            directory_mtime = os.stat(directory).st_mtime
+        except OSError:
+            return None
+
+        with self._lock:
+            manifest = self.__load(manifest_path(directory))
+        entry = manifest.get('sequences', {}).get(base_name)
+        if not entry:
+            return None
+        if not allow_stale and entry.get('directory_mtime') != directory_mtime:
+            return None
+        return entry
+
+    def read_frames(self, file_name, restat=False):
+        """
+        Returns the (frame, path, size, mtime) tuples of the sequence
+        file_name from its manifest, or None if it has no valid manifest.
+
+        restat: If True, sizes and mtimes are stat'ed again, like
+                FrameIndex.find, for frames rewritten in place since the
+                manifest was written.
+        """
+        entry = self.read(file_name)
+        if entry is None:
+            return None
+        directory = os.path.normpath(os.path.dirname(file_name))
+        base_name = os.path.basename(file_name)
+        frames = [(frame, os.path.join(directory,
+                                       format_frame_path(base_name, frame)),
+                   size, mtime)
+                  for frame, size, mtime in (f[:3] for f in entry['frames'])]
+        return restat_frames(frames) if restat else frames
+
+    def write(self, file_name, frames, profile=None, node=None,
+              upstream=None):
+        """
+        Records the frames of the sequence file_name in the manifest of its
+        directory. frames are (frame, path, size, mtime) tuples as returned
+        by FrameIndex.find, upstream an optional dictionary of frame ->
+        upstream fingerprint. Returns the path of the manifest.
+        """
+        upstream = upstream or {}
+        directory, base_name = os.path.split(file_name)
+        path = manifest_path(directory)
+        directory_mtime = os.stat(directory).st_mtime
+
+        with self._lock:
+            # a new manifest, the loaded one stays as is if writing fails
+            manifest = dict(self.__load(path))
+            manifest['version'] = MANIFEST_VERSION
+            manifest['sequences'] = dict(manifest.get('sequences', {}))
+            manifest['sequences'][base_name] = {
+                'pattern': file_name,
+                'profile': profile,
+                'node': node,
+                'directory_mtime': directory_mtime,
+                'written': time.time(),
+                'first': frames[0][0] if frames else None,
+                'last': frames[-1][0] if frames else None,
+                'frames': [[frame, size, mtime, upstream.get(frame)]
+                           for frame, _, size, mtime in frames],
+            }
+
+            self._manifests.pop(path, None)
+            temp_path = '%s.%d.tmp' % (path, os.getpid())
+            try:
+                with open(temp_path, 'w') as manifest_file:
+                    json.dump(manifest, manifest_file, separators=(',', ':'))
+                if os.name == 'nt' and os.path.exists(path):
+                    os.remove(path)
+                os.rename(temp_path, path)
+            except Exception:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+        return path
+
+    def __load(self, path):
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return {}
+
+        cached = self._manifests.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        try:
+            with open(path) as manifest_file:
+                manifest = json.load(manifest_file)
+        except (IOError, OSError, ValueError):
+            return {}
+        if manifest.get('version') != MANIFEST_VERSION:
+            return {}
+
+        self._manifests[path] = (mtime, manifest)
+        return manifest
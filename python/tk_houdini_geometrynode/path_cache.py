@@ -0,0 +1,78 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+
+class PathCache(object):
+    """
+    Memoizes resolved output paths.
+
+    Entries are keyed by everything the resolved path depends on and tagged
+    with the session id of the node (and camera) they were resolved for, so
+    they can be dropped as soon as one of those changes.
+    """
+
+    def __init__(self):
+        self._paths = {}
+        self._keys_by_node = {}
+        self._keys_by_camera = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Returns the cached path for the key or None.
+        """
+        path = self._paths.get(key)
+        if path is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return path
+
+    def set(self, key, path, node_id, camera_id=None):
+        """
+        Stores a resolved path for the key.
+        """
+        self._paths[key] = path
+        self._keys_by_node.setdefault(node_id, set()).add(key)
+        if camera_id is not None:
+            self._keys_by_camera.setdefault(camera_id, set()).add(key)
+
+    def invalidate(self):
+        """
+        Drops all cached paths.
+        """
+        self._paths.clear()
+        self._keys_by_node.clear()
+        self._keys_by_camera.clear()
+
+    def invalidate_node(self, node_id):
+        """
+        Drops all paths resolved for the node with the given session id.
+        """
+        self.__discard(self._keys_by_node.pop(node_id, ()))
+
+    def invalidate_camera(self, camera_id):
+        """
+        Drops all paths depending on the camera with the given session id.
+        """
+        self.__discard(self._keys_by_camera.pop(camera_id, ()))
+
+    def stats(self):
+        """
+        Returns hit/miss counters and the current number of entries.
+        """
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._paths)}
+
+    def __discard(self, keys):
+        for key in keys:
+            self._paths.pop(key, None)
@@ -0,0 +1,83 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+from collections import namedtuple
+
+# One configured instance of the app. templates and settings are resolved
+# once and must not be modified.
+Profile = namedtuple('Profile', 'instance_name name templates settings')
+
+TEMPLATE_SETTINGS = ('work_file_template', 'work_cache_template',
+                     'work_render_template')
+SETTINGS = ('name', 'default_node_name')
+
+
+def make_profile(app):
+    """
+    Returns the Profile of an app instance.
+    """
+    return Profile(app.instance_name,
+                   app.get_setting('name'),
+                   dict((name, app.get_template(name))
+                        for name in TEMPLATE_SETTINGS),
+                   dict((name, app.get_setting(name)) for name in SETTINGS))
+
+
+class ProfileTable(object):
+    """
+    The profiles of all instances of the app running in the engine, by the
+    index of the profile menu of the nodes.
+
+    The instance behind each menu index is read from the menu once per node
+    type, the menu being the same for all nodes of a type.
+    """
+
+    def __init__(self, apps, config_parm):
+        """
+        apps: The app instances, each is a profile.
+        config_parm: Name of the parm holding the profile of a node.
+        """
+        self._config_parm = config_parm
+        # instance name -> Profile
+        self._profiles = dict((app.instance_name, make_profile(app))
+                              for app in apps)
+        # (category name, type name) -> Profile or None by menu index
+        self._menus = {}
+
+    def profiles(self):
+        """
+        Returns all profiles.
+        """
+        return list(self._profiles.values())
+
+    def get(self, instance_name):
+        """
+        Returns the profile of an app instance or None.
+        """
+        return self._profiles.get(instance_name)
+
+    def profile(self, node):
+        """
+        Returns the profile selected on the node, or None if its menu entry
+        isn't a running app instance.
+        """
+        parm = node.parm(self._config_parm)
+        node_type = node.type()
+        key = (node_type.category().name(), node_type.name())
+        menu = self._menus.get(key)
+        if menu is None:
+            menu = tuple(self._profiles.get(item)
+                         for item in parm.menuItems())
+            self._menus[key] = menu
+
+        index = parm.eval()
+        if 0 <= index < len(menu):
+            return menu[index]
+        return None
@@ -0,0 +1,199 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+from collections import OrderedDict
+
+import hou
+
+
+class NodeRegistry(object):
+    """
+    Keeps track of the sgtk nodes of the current scene.
+
+    The scene is scanned once, on first use after a scene load, and kept
+    current through node event callbacks. Nodes are indexed by session id,
+    so renaming a node or one of its parents doesn't invalidate anything.
+
+    Undo restores nodes without running OnCreated, so the networks holding
+    registered nodes, and their parents, are watched for new children as
+    well. Lookups never scan the scene again until it is invalidated.
+    """
+
+    CATEGORIES = {'Sop': 'sop', 'Driver': 'rop'}
+
+    def __init__(self, scan, get_profile, config_parm, type_name):
+        """
+        scan: Callable returning all sgtk nodes of the scene.
+        get_profile: Callable returning the profile name of a node.
+        config_parm: Name of the parm holding the profile of a node.
+        type_name: Name of the sgtk node types.
+        """
+        self._scan = scan
+        self._get_profile = get_profile
+        self._config_parm = config_parm
+        self._type_name = type_name
+        self._populated = False
+        # session id -> network watched for new children
+        self._networks = {}
+        # class -> session id -> node
+        self._nodes = {'sop': OrderedDict(), 'rop': OrderedDict()}
+        # session id -> (class, profile)
+        self._entries = {}
+        # profile -> set of session ids
+        self._by_profile = {}
+
+    def nodes(self, class_=None):
+        """
+        Returns the list of registered nodes, optionally only of the given
+        class ('sop' or 'rop').
+        """
+        self.__populate()
+        if class_:
+            return list(self._nodes[class_].values())
+        return (list(self._nodes['sop'].values()) +
+                list(self._nodes['rop'].values()))
+
+    def node(self, path):
+        """
+        Returns the registered node at the given path or None.
+        """
+        self.__populate()
+        node = hou.node(path)
+        if node is None or node.sessionId() not in self._entries:
+            return None
+        return node
+
+    def nodes_by_profile(self, profile):
+        """
+        Returns the list of registered nodes using the given profile.
+        """
+        self.__populate()
+        nodes = []
+        for node_id in self._by_profile.get(profile, ()):
+            class_ = self._entries[node_id][0]
+            nodes.append(self._nodes[class_][node_id])
+        return nodes
+
+    def register(self, node):
+        """
+        Adds a node to the registry. Called whenever a sgtk node is created,
+        nodes of watched networks are picked up without it.
+        """
+        if not self._populated:
+            # picked up by the scan
+            return
+        self.__add(node)
+
+    def invalidate(self):
+        """
+        Forgets all nodes, the scene is scanned again on next use.
+        """
+        for class_nodes in self._nodes.values():
+            for node in class_nodes.values():
+                self.__unwatch(node)
+            class_nodes.clear()
+        for network in self._networks.values():
+            self.__unwatch_network(network)
+        self._networks.clear()
+        self._entries.clear()
+        self._by_profile.clear()
+        self._populated = False
+
+    def __populate(self):
+        if self._populated:
+            return
+        for node in self._scan():
+            self.__add(node)
+        self._populated = True
+
+    def __add(self, node):
+        node_id = node.sessionId()
+        if node_id in self._entries:
+            return
+        class_ = self.CATEGORIES.get(node.type().category().name())
+        if class_ is None:
+            return
+
+        self._nodes[class_][node_id] = node
+        self._entries[node_id] = (class_, None)
+        self.__index_profile(node)
+
+        node.addEventCallback((hou.nodeEventType.BeingDeleted,
+                               hou.nodeEventType.ParmTupleChanged),
+                              self.__on_node_event)
+        self.__watch_networks(node)
+
+    def __remove(self, node_id):
+        class_, profile = self._entries.pop(node_id, (None, None))
+        if class_ is None:
+            return
+        self._nodes[class_].pop(node_id, None)
+        self._by_profile.get(profile, set()).discard(node_id)
+
+    def __index_profile(self, node):
+        node_id = node.sessionId()
+        if node_id not in self._entries:
+            return
+        class_, old_profile = self._entries[node_id]
+        try:
+            profile = self._get_profile(node)
+        except Exception:
+            profile = None
+        self._by_profile.get(old_profile, set()).discard(node_id)
+        self._by_profile.setdefault(profile, set()).add(node_id)
+        self._entries[node_id] = (class_, profile)
+
+    def __is_sgtk_node(self, node):
+        node_type = node.type()
+        return (node_type.name() == self._type_name and
+                node_type.category().name() in self.CATEGORIES)
+
+    def __watch_networks(self, node):
+        network = node.parent()
+        while network is not None and \
+                network.sessionId() not in self._networks:
+            self._networks[network.sessionId()] = network
+            network.addEventCallback((hou.nodeEventType.ChildCreated,),
+                                     self.__on_child_created)
+            network = network.parent()
+
+    def __unwatch_network(self, network):
+        try:
+            network.removeEventCallback((hou.nodeEventType.ChildCreated,),
+                                        self.__on_child_created)
+        except hou.ObjectWasDeleted:
+            pass
+
+    def __on_child_created(self, event_type, **kwargs):
+        if not self._populated:
+            return
+        child = kwargs['child_node']
+        # a restored network brings back the sgtk nodes inside it
+        for node in (child,) + tuple(child.allSubChildren()):
+            if self.__is_sgtk_node(node):
+                self.__add(node)
+
+    def __unwatch(self, node):
+        try:
+            node.removeEventCallback((hou.nodeEventType.BeingDeleted,
+                                      hou.nodeEventType.ParmTupleChanged),
+                                     self.__on_node_event)
+        except hou.ObjectWasDeleted:
+            pass
+
+    def __on_node_event(self, event_type, **kwargs):
+        node = kwargs['node']
+        if event_type == hou.nodeEventType.BeingDeleted:
+            self.__remove(node.sessionId())
+            return
+
+        parm_tuple = kwargs.get('parm_tuple')
+        if parm_tuple is None or parm_tuple.name() == self._config_parm:
+            self.__index_profile(node)
@@ -0,0 +1,110 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+import subprocess
+import sys
+import threading
+
+from sgtk.platform.qt import QtCore, QtGui
+
+
+class DirectoryLookup(QtCore.QObject):
+    """
+    Runs a file system lookup on a worker thread while showing a cancellable
+    progress dialog. The result is delivered back on the UI thread.
+    """
+
+    # directory or None, error message or None
+    finished = QtCore.Signal(object, object)
+
+    def __init__(self, lookup, timeout=30, parent=None):
+        """
+        lookup: Callable returning the directory to show or None. It must
+                not touch hou, it runs outside of the UI thread.
+        timeout: Seconds after which the lookup is given up.
+        """
+        QtCore.QObject.__init__(self, parent)
+        self._lookup = lookup
+        self._callback = None
+        self._done = False
+
+        # emitted from the worker thread, so this is a queued connection
+        self.finished.connect(self.__on_finished)
+
+        self._progress = QtGui.QProgressDialog(
+            "Looking up the output files...", "Cancel", 0, 0)
+        self._progress.setWindowTitle("Show in File System")
+        self._progress.setMinimumDuration(500)
+        self._progress.canceled.connect(self.cancel)
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(int(timeout * 1000))
+        self._timer.timeout.connect(self.__on_timeout)
+
+    def start(self, callback):
+        """
+        Starts the lookup. callback(directory, error) is called on the UI
+        thread, unless the lookup is cancelled.
+        """
+        self._callback = callback
+        worker = threading.Thread(target=self.__run)
+        worker.daemon = True
+        worker.start()
+        self._timer.start()
+
+    def cancel(self):
+        """
+        Drops the result of the lookup. The worker can't be interrupted
+        but its result is ignored.
+        """
+        self.__finish()
+
+    def __run(self):
+        try:
+            directory, error = self._lookup(), None
+        except Exception as e:
+            directory, error = None, str(e)
+        self.finished.emit(directory, error)
+
+    def __on_finished(self, directory, error):
+        if self.__finish():
+            self._callback(directory, error)
+
+    def __on_timeout(self):
+        if self.__finish():
+            self._callback(None, "Timed out looking up the output files.")
+
+    def __finish(self):
+        if self._done:
+            return False
+        self._done = True
+        self._timer.stop()
+        self._progress.reset()
+        return True
+
+
+def launch_file_browser(directory):
+    """
+    Opens the directory in the file browser of the platform without waiting
+    for it. Returns the launched command.
+    """
+    system = sys.platform
+    if system.startswith("linux"):
+        cmd = ["xdg-open", directory]
+    elif system == "darwin":
+        cmd = ["open", directory]
+    elif system == "win32":
+        cmd = ["explorer", directory]
+    else:
+        raise Exception("Platform '%s' is not supported." % system)
+
+    subprocess.Popen(cmd)
+    return cmd
@@ -0,0 +1,69 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+import threading
+from collections import OrderedDict
+
+import sgtk
+
+
+def match_fields(template, path):
+    """
+    Returns the fields of path parsed with template, or None if it doesn't
+    match. Parses path once, where validate followed by get_fields parses
+    it twice.
+    """
+    try:
+        return template.get_fields(path)
+    except sgtk.TankError:
+        return None
+
+
+class TemplateMatcher(object):
+    """
+    Memoizes match_fields by template and path in a bounded LRU. Parsing
+    only depends on the path, so entries never go stale. Lookups may run
+    on worker threads.
+    """
+
+    def __init__(self, capacity=256):
+        self._capacity = capacity
+        self._lock = threading.Lock()
+        # (id(template), path) -> (template, fields or None)
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def fields(self, template, path):
+        """
+        Returns a copy of the fields of path parsed with template, or None
+        if it doesn't match.
+        """
+        key = (id(template), path)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] is template:
+                # most recently used last
+                self._entries[key] = entry
+                self.hits += 1
+                return dict(entry[1]) if entry[1] is not None else None
+
+        fields = match_fields(template, path)
+
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = (template, fields)
+            while len(self._entries) > self._capacity:
+                self._entries.popitem(last=False)
+        return dict(fields) if fields is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
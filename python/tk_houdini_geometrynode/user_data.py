@@ -0,0 +1,82 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+"""
+Codec for python structures stored in node user data.
+
+sgtk-02 (written): 'sgtk-02:' + 'j' + compact json, or
+                   'sgtk-02:' + 'z' + base64(zlib(json)) for payloads of at
+                   least COMPRESSION_THRESHOLD characters.
+sgtk-01 (read only): 'sgtk-01:' + base64(zlib(pickle)).
+"""
+
+import base64
+import json
+import pickle
+import zlib
+from io import BytesIO
+
+PREFIX_V1 = 'sgtk-01:'
+PREFIX_V2 = 'sgtk-02:'
+
+FLAG_JSON = 'j'
+FLAG_ZLIB = 'z'
+
+# json payloads shorter than this are stored uncompressed
+COMPRESSION_THRESHOLD = 1024
+
+
+def encode(data, threshold=COMPRESSION_THRESHOLD):
+    """
+    Returns the sgtk-02 string of a json serializable python structure.
+    """
+    payload = json.dumps(data, separators=(',', ':'))
+    if len(payload) < threshold:
+        return PREFIX_V2 + FLAG_JSON + payload
+
+    compressed = base64.b64encode(zlib.compress(payload.encode('utf-8')))
+    return PREFIX_V2 + FLAG_ZLIB + compressed.decode('ascii')
+
+
+def decode(data_string):
+    """
+    Returns the python structure stored in a sgtk-02 or sgtk-01 string.
+    """
+    if data_string.startswith(PREFIX_V2):
+        flag = data_string[len(PREFIX_V2)]
+        payload = data_string[len(PREFIX_V2) + 1:]
+        if flag == FLAG_ZLIB:
+            payload = zlib.decompress(base64.b64decode(payload))
+            payload = payload.decode('utf-8')
+        elif flag != FLAG_JSON:
+            raise ValueError("Unknown sgtk-02 flag '%s'." % flag)
+        return json.loads(payload)
+
+    if data_string.startswith(PREFIX_V1):
+        payload = zlib.decompress(base64.b64decode(data_string[len(PREFIX_V1):]))
+        return _loads_pickle(payload)
+
+    raise ValueError("Unknown user data format '%s'." % data_string[:8])
+
+
+class _SafeUnpickler(pickle.Unpickler):
+    """
+    Unpickler for legacy sgtk-01 data which only ever holds builtin
+    containers. Refuses to import anything, so unpickling untrusted user
+    data can't run code.
+    """
+
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(
+            "Global '%s.%s' is not allowed in user data." % (module, name))
+
+
+def _loads_pickle(payload):
+    return _SafeUnpickler(BytesIO(payload)).load()
@@ -0,0 +1,213 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+"""
+Integrity checks of cached frame files, run on a pool of threads.
+"""
+
+import os
+import struct
+import threading
+
+try:
+    from Queue import Queue, Empty, Full
+except ImportError:
+    from queue import Queue, Empty, Full
+
+STATUS_OK = 'ok'
+STATUS_MISSING = 'missing'
+STATUS_EMPTY = 'empty'
+STATUS_BAD_HEADER = 'bad_header'
+STATUS_UNREADABLE = 'unreadable'
+# shorter than its header says, or than its neighbouring frames suggest
+STATUS_TRUNCATED = 'truncated'
+# readable and not empty, but no header rule applies
+STATUS_UNCHECKED = 'unchecked'
+
+# file name suffix -> accepted leading bytes
+HEADER_MAGIC = (
+    ('.gz', (b'\x1f\x8b',)),
+    ('.bgeo', (b'Bgeo', b'\x7fNSJb')),
+    ('.geo', (b'PGEOMETRY', b'[', b'{')),
+)
+HEADER_SIZE = 16
+
+# .sc files are Blosc compressed and start with the 16 byte header of their
+# first chunk: format version, compressor version, flags, type size, then
+# little endian uncompressed size, block size and compressed chunk size
+SC_SUFFIX = '.sc'
+SC_HEADER = struct.Struct('<BBBBIII')
+SC_VERSIONS = range(1, 6)
+
+# a frame is truncated below this fraction of the median size of its
+# neighbours, up to NEIGHBOURS frames on each side
+TRUNCATED_RATIO = 0.5
+NEIGHBOURS = 2
+
+# how long blocked queue operations wait before checking for cancellation
+_POLL = 0.1
+
+
+def check_sc_header(header, size):
+    """
+    Returns the status of a .sc file from its first HEADER_SIZE bytes and
+    its size: bad_header if they aren't a Blosc chunk header, truncated if
+    the file is shorter than its first chunk, ok otherwise.
+    """
+    if len(header) < SC_HEADER.size:
+        return STATUS_BAD_HEADER
+    version, _, _, typesize, _, _, chunk_size = SC_HEADER.unpack(
+        header[:SC_HEADER.size])
+    if version not in SC_VERSIONS or typesize == 0 or \
+            chunk_size < SC_HEADER.size:
+        return STATUS_BAD_HEADER
+    if chunk_size > size:
+        return STATUS_TRUNCATED
+    return STATUS_OK
+
+
+def minimum_sizes(frames):
+    """
+    Returns frame -> the size below which the frame is considered
+    truncated, from the median size of its neighbouring frames. frames are
+    (frame, path, size, mtime) tuples sorted by frame, frames with fewer
+    than two non-empty neighbours get no minimum.
+    """
+    sizes = [size for _, _, size, _ in frames]
+    minimums = {}
+    for index, entry in enumerate(frames):
+        neighbours = sorted(
+            size for size in (sizes[max(0, index - NEIGHBOURS):index] +
+                              sizes[index + 1:index + 1 + NEIGHBOURS])
+            if size)
+        if len(neighbours) < 2:
+            continue
+        middle = len(neighbours) // 2
+        if len(neighbours) % 2:
+            median = neighbours[middle]
+        else:
+            median = (neighbours[middle - 1] + neighbours[middle]) / 2.0
+        minimums[entry[0]] = median * TRUNCATED_RATIO
+    return minimums
+
+
+def check_frame(frame, path, min_size=None):
+    """
+    Returns the verification result of a single frame file: a dictionary
+    with frame, path, status, size and error.
+
+    min_size: Optional size below which the frame is truncated, see
+              minimum_sizes.
+    """
+    result = {'frame': frame, 'path': path, 'status': STATUS_OK,
+              'size': None, 'error': None}
+    try:
+        result['size'] = os.path.getsize(path)
+    except OSError:
+        result['status'] = STATUS_MISSING
+        return result
+
+    if result['size'] == 0:
+        result['status'] = STATUS_EMPTY
+        return result
+
+    try:
+        with open(path, 'rb') as frame_file:
+            header = frame_file.read(HEADER_SIZE)
+    except (IOError, OSError) as e:
+        result['status'] = STATUS_UNREADABLE
+        result['error'] = str(e)
+        return result
+
+    if path.endswith(SC_SUFFIX):
+        result['status'] = check_sc_header(header, result['size'])
+    else:
+        for suffix, magics in HEADER_MAGIC:
+            if path.endswith(suffix):
+                if not any(header.startswith(m) for m in magics):
+                    result['status'] = STATUS_BAD_HEADER
+                break
+        else:
+            result['status'] = STATUS_UNCHECKED
+
+    if result['status'] in (STATUS_OK, STATUS_UNCHECKED) and min_size and \
+            result['size'] < min_size:
+        result['status'] = STATUS_TRUNCATED
+
+    return result
+
+
+def verify_frames(frames, workers=8):
+    """
+    Checks (frame, path) pairs, or (frame, path, min_size) triples, on a
+    pool of worker threads and yields the results of check_frame as they
+    complete, so not in frame order.
+
+    frames may be a generator, it's consumed as the workers progress and at
+    most a few items per worker are in flight at any time.
+    """
+    workers = max(1, int(workers))
+    tasks = Queue(maxsize=workers * 4)
+    results = Queue(maxsize=workers * 4)
+    stop = threading.Event()
+    done = object()
+
+    def put(queue, item):
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=_POLL)
+                return True
+            except Full:
+                pass
+        return False
+
+    def feed():
+        try:
+            for item in frames:
+                if not put(tasks, item):
+                    return
+        finally:
+            for _ in range(workers):
+                put(tasks, done)
+
+    def work():
+        while not stop.is_set():
+            try:
+                item = tasks.get(timeout=_POLL)
+            except Empty:
+                continue
+            if item is done:
+                put(results, done)
+                return
+            try:
+                result = check_frame(*item)
+            except Exception as e:
+                result = {'frame': item[0], 'path': item[1],
+                          'status': STATUS_UNREADABLE, 'size': None,
+                          'error': str(e)}
+            put(results, result)
+
+    threads = [threading.Thread(target=feed)]
+    threads += [threading.Thread(target=work) for _ in range(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    try:
+        finished = 0
+        while finished < workers:
+            result = results.get()
+            if result is done:
+                finished += 1
+            else:
+                yield result
+    finally:
+        # also reached when the consumer stops iterating early
+        stop.set()
@@ -0,0 +1,229 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+"""
+Converts and validates the geometry nodes of many hip files in parallel.
+
+Each hip file is processed by its own hython process, at most --jobs at a
+time, and gets a json report in --output-dir. A summary of all files is
+written to stdout.
+
+Usage: python scripts/geometry_batch.py [--actions validate to-geometry
+                                         from-geometry] [--save]
+                                        [--jobs N] [--interpreter CMD]
+                                        [--output-dir DIR] HIP [HIP ...]
+
+Actions run in the given order:
+    validate       resolve the output path of every node, report failures
+                   and collisions
+    to-geometry    convert Shotgun Geometry nodes to regular nodes
+    from-geometry  convert regular nodes back to Shotgun Geometry nodes
+
+The hython processes need Toolkit importable. If no engine is running, the
+tk-houdini engine is started for the context of each hip file.
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shlex
+import subprocess
+import sys
+import time
+import traceback
+from multiprocessing.pool import ThreadPool
+
+APP_NAME = 'tk-houdini-geometrynode'
+ENGINE_NAME = 'tk-houdini'
+ACTIONS = ('validate', 'to-geometry', 'from-geometry')
+
+
+def report_path(output_dir, hip_file):
+    """
+    Returns the path of the json report of a hip file. Hip files of the
+    same name in different directories get different reports.
+    """
+    base_name = os.path.splitext(os.path.basename(hip_file))[0]
+    digest = hashlib.sha1(
+        os.path.abspath(hip_file).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(output_dir, '%s_%s.json' % (base_name, digest))
+
+
+# -- worker, runs in hython ---------------------------------------------------
+
+def get_app(hip_file):
+    """
+    Returns the geometry node app, starting the engine for the context of
+    the hip file if none is running.
+    """
+    import sgtk
+
+    engine = sgtk.platform.current_engine()
+    if engine is None:
+        tk = sgtk.sgtk_from_path(hip_file)
+        context = tk.context_from_path(hip_file)
+        engine = sgtk.platform.start_engine(ENGINE_NAME, tk, context)
+
+    for app in engine.apps.values():
+        if app.name == APP_NAME:
+            return app
+    raise RuntimeError("%s is not configured for %s." % (APP_NAME,
+                                                         hip_file))
+
+
+def validate(app):
+    """
+    Returns the output paths, the nodes whose path can't be resolved and
+    the output collisions of the scene.
+    """
+    nodes = app.handler.get_nodes()
+    paths = app.compute_output_paths()
+    return {'nodes': len(nodes),
+            'paths': paths,
+            'unresolved': sorted(node.path() for node in nodes
+                                 if node.path() not in paths),
+            'collisions': app.check_output_collisions()}
+
+
+def run_actions(hip_file, actions, save):
+    """
+    Loads the hip file, runs the actions on it and saves it if asked to.
+    Returns the report.
+
+    The engine is started before loading, so the geometry node types are
+    installed when the nodes of the hip file are created.
+    """
+    import hou
+
+    report = {'hip_file': hip_file, 'actions': {}, 'saved': False,
+              'error': None}
+    start = time.time()
+    try:
+        app = get_app(hip_file)
+        hou.hipFile.load(hip_file, suppress_save_prompt=True,
+                         ignore_load_warnings=True)
+
+        for action in actions:
+            if action == 'validate':
+                report['actions'][action] = validate(app)
+            elif action == 'to-geometry':
+                report['actions'][action] = app.convert_to_geometry_nodes()
+            elif action == 'from-geometry':
+                report['actions'][action] = \
+                    app.convert_from_geometry_nodes()
+
+        if save:
+            hou.hipFile.save()
+            report['saved'] = True
+    except Exception:
+        report['error'] = traceback.format_exc()
+
+    report['duration_s'] = time.time() - start
+    return report
+
+
+def worker_main(args):
+    report = run_actions(args.hip_files[0], args.actions, args.save)
+    with open(args.report, 'w') as report_file:
+        json.dump(report, report_file, indent=2, sort_keys=True,
+                  default=str)
+    return 1 if report['error'] else 0
+
+
+# -- driver ---------------------------------------------------------------------
+
+def process_file(interpreter, hip_file, actions, save, output_dir):
+    """
+    Runs the actions on a hip file in a new interpreter process and returns
+    the summary of its report.
+    """
+    path = report_path(output_dir, hip_file)
+    # the hip file goes first, --actions takes all the arguments after it
+    cmd = interpreter + [os.path.abspath(__file__), hip_file, '--worker',
+                         '--report', path, '--actions'] + list(actions)
+    if save:
+        cmd.append('--save')
+
+    start = time.time()
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT)
+    output = process.communicate()[0]
+    summary = {'hip_file': hip_file, 'report': path,
+               'returncode': process.returncode,
+               'duration_s': time.time() - start, 'error': None}
+
+    try:
+        with open(path) as report_file:
+            summary['error'] = json.load(report_file)['error']
+    except (IOError, OSError, ValueError):
+        summary['report'] = None
+        summary['error'] = output.decode('utf-8', 'replace')
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip(),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('hip_files', metavar='HIP', nargs='+')
+    parser.add_argument('--actions', nargs='+', choices=ACTIONS,
+                        default=['validate'])
+    parser.add_argument('--save', action='store_true',
+                        help='save the hip files after the actions')
+    parser.add_argument('--jobs', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help='number of hython processes run at once')
+    parser.add_argument('--interpreter', default='hython',
+                        help='command running the workers, default hython')
+    parser.add_argument('--output-dir', default='.',
+                        help='directory of the per file json reports')
+    parser.add_argument('--worker', action='store_true',
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--report', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        return worker_main(args)
+
+    if not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+    interpreter = shlex.split(args.interpreter)
+
+    # each hip file once, two workers saving the same file would race
+    hip_files = []
+    for hip_file in args.hip_files:
+        hip_file = os.path.abspath(hip_file)
+        if hip_file not in hip_files:
+            hip_files.append(hip_file)
+
+    def process(hip_file):
+        return process_file(interpreter, hip_file, args.actions, args.save,
+                            args.output_dir)
+
+    start = time.time()
+    pool = ThreadPool(max(1, args.jobs))
+    try:
+        files = pool.map(process, hip_files)
+    finally:
+        pool.close()
+        pool.join()
+
+    summary = {'files': files,
+               'failed': [f['hip_file'] for f in files if f['error']],
+               'duration_s': time.time() - start}
+    json.dump(summary, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,26 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+"""
+Makes the app package importable outside of Houdini, against the mock hou
+and sgtk modules of the benchmarks.
+"""
+
+import os
+import sys
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              '..', 'benchmarks')
+if BENCHMARKS_DIR not in sys.path:
+    sys.path.insert(0, BENCHMARKS_DIR)
+
+import harness  # noqa: E402
+
+harness.install()
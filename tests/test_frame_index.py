@@ -0,0 +1,131 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import support  # noqa: F401
+
+from tk_houdini_geometrynode import frame_index
+
+# file name -> (padding, frame 7, printf form)
+TOKENS = {
+    'geo.$F.bgeo.sc': (1, 'geo.7.bgeo.sc', 'geo.%01d.bgeo.sc'),
+    'geo.$F4.bgeo.sc': (4, 'geo.0007.bgeo.sc', 'geo.%04d.bgeo.sc'),
+    'geo.${F4}.bgeo.sc': (4, 'geo.0007.bgeo.sc', 'geo.%04d.bgeo.sc'),
+    'geo.%d.bgeo.sc': (1, 'geo.7.bgeo.sc', 'geo.%01d.bgeo.sc'),
+    'geo.%03d.bgeo.sc': (3, 'geo.007.bgeo.sc', 'geo.%03d.bgeo.sc'),
+    'geo.####.bgeo.sc': (4, 'geo.0007.bgeo.sc', 'geo.%04d.bgeo.sc'),
+}
+
+
+class TestFrameTokens(unittest.TestCase):
+
+    def test_format_frame_path(self):
+        for file_name, (_, formatted, _) in TOKENS.items():
+            self.assertEqual(frame_index.format_frame_path(file_name, 7),
+                             formatted, file_name)
+
+    def test_normalize_frame_pattern(self):
+        for file_name, (_, _, normalized) in TOKENS.items():
+            self.assertEqual(frame_index.normalize_frame_pattern(file_name),
+                             normalized, file_name)
+
+    def test_compile_frame_pattern(self):
+        for file_name, (padding, formatted, _) in TOKENS.items():
+            pattern = frame_index.compile_frame_pattern(file_name)
+            match = pattern.match(formatted)
+            self.assertTrue(match, file_name)
+            self.assertEqual(int(match.group('frame')), 7)
+            # fewer digits than the padding don't match
+            if padding > 1:
+                self.assertFalse(pattern.match(
+                    formatted.replace('0' * (padding - 1) + '7', '7')))
+
+    def test_compile_frame_pattern_frames(self):
+        pattern = frame_index.compile_frame_pattern('geo.$F4.bgeo.sc')
+        self.assertEqual(pattern.match('geo.12345.bgeo.sc').group('frame'),
+                         '12345')
+        self.assertEqual(pattern.match('geo.-0012.bgeo.sc').group('frame'),
+                         '-0012')
+        self.assertFalse(pattern.match('geo.0001.bgeo'))
+        self.assertFalse(pattern.match('geoX0001.bgeo.sc'))
+
+    def test_not_a_sequence(self):
+        self.assertIsNone(frame_index.compile_frame_pattern('geo.bgeo.sc'))
+        self.assertIsNone(
+            frame_index.compile_frame_pattern('geo.$F4.$F4.bgeo.sc'))
+
+    def test_contiguous_chunks(self):
+        self.assertEqual(frame_index.contiguous_chunks([5, 1, 2, 3, 7, 8]),
+                         [(1, 3, 1), (5, 5, 1), (7, 8, 1)])
+        self.assertEqual(frame_index.contiguous_chunks([1, 3, 5, 9], 2),
+                         [(1, 5, 2), (9, 9, 2)])
+        self.assertEqual(frame_index.contiguous_chunks([]), [])
+
+
+class TestFrameIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'geo.$F4.bgeo.sc')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, frames, size):
+        for frame in frames:
+            path = frame_index.format_frame_path(self.file_name, frame)
+            with open(path, 'wb') as frame_file:
+                frame_file.write(b'\0' * size)
+
+    def test_find(self):
+        self.write([3, 1, 2], 10)
+        self.write([1], 10)
+        open(os.path.join(self.directory, 'other.0001.bgeo.sc'), 'w').close()
+
+        frames = frame_index.FrameIndex().find(self.file_name)
+        self.assertEqual([f[0] for f in frames], [1, 2, 3])
+        self.assertEqual([f[2] for f in frames], [10, 10, 10])
+        self.assertEqual(frames[0][1], frame_index.format_frame_path(
+            os.path.normpath(self.file_name), 1))
+
+    def test_scan_false_needs_a_listing(self):
+        self.write([1], 10)
+        index = frame_index.FrameIndex()
+        self.assertIsNone(index.find(self.file_name, scan=False))
+        index.find(self.file_name)
+        self.assertEqual(len(index.find(self.file_name, scan=False)), 1)
+
+    def test_restat_in_place_rewrite(self):
+        self.write([1, 2, 3], 10)
+        index = frame_index.FrameIndex()
+        index.find(self.file_name)
+        self.write([1, 2, 3], 1000)
+
+        # the list of frames is reused as is, restat updates the sizes
+        self.assertEqual([f[2] for f in index.find(self.file_name)],
+                         [10, 10, 10])
+        self.assertEqual(
+            [f[2] for f in index.find(self.file_name, restat=True)],
+            [1000, 1000, 1000])
+
+    def test_not_indexed(self):
+        index = frame_index.FrameIndex()
+        self.assertIsNone(index.find(os.path.join(self.directory,
+                                                  'geo.bgeo.sc')))
+        self.assertIsNone(index.find(os.path.join(self.directory, '$F4',
+                                                  'geo.$F4.bgeo.sc')))
+
+
+if __name__ == '__main__':
+    unittest.main()
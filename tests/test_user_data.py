@@ -0,0 +1,83 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+import pickle
+import unittest
+
+import support  # noqa: F401
+
+from tk_houdini_geometrynode import user_data
+
+# written by the python 2 handler before sgtk-02:
+# 'sgtk-01:' + base64(zlib(pickle.dumps(LEGACY_DATA)))
+LEGACY_DATA = [{'node': '/obj/geo1/null1', 'input': 0, 'session_id': 12},
+               {'node': '/obj/geo1/merge1', 'input': 1}]
+LEGACY_STRING = (
+    'sgtk-01:eJxVjDsOgDAMQ3dfpEyU8D0DMwdAoEZVUWkrAvcnjGx+lv2qWBpUrhAWk7Jjg9'
+    'JqtHk/rOdMNj0xkrYdZDEhledW6DE3HwuLhJzW4LQcMFML2dQ2wv8tJ1+eP80E8fom3dUv'
+    'qVwjPw==')
+# the same, pickling os.system
+LEGACY_GLOBAL_STRING = 'sgtk-01:eJxLLsgvzqzgKq4sLknN5Sow4NIDAEHeBig='
+
+
+class TestLegacyDecode(unittest.TestCase):
+
+    def test_python2_pickle(self):
+        self.assertEqual(user_data.decode(LEGACY_STRING), LEGACY_DATA)
+
+    def test_refuses_globals(self):
+        self.assertRaises(pickle.UnpicklingError, user_data.decode,
+                          LEGACY_GLOBAL_STRING)
+
+
+class TestRoundTrip(unittest.TestCase):
+
+    def payload(self, length):
+        """
+        Returns a structure whose compact json is length characters long.
+        """
+        # ["", ...] with the string filling the rest
+        return ['x' * (length - 4)]
+
+    def test_below_threshold_is_plain_json(self):
+        data = self.payload(user_data.COMPRESSION_THRESHOLD - 1)
+        encoded = user_data.encode(data)
+        self.assertTrue(encoded.startswith(
+            user_data.PREFIX_V2 + user_data.FLAG_JSON))
+        self.assertEqual(user_data.decode(encoded), data)
+
+    def test_at_threshold_is_compressed(self):
+        data = self.payload(user_data.COMPRESSION_THRESHOLD)
+        encoded = user_data.encode(data)
+        self.assertTrue(encoded.startswith(
+            user_data.PREFIX_V2 + user_data.FLAG_ZLIB))
+        self.assertLess(len(encoded), user_data.COMPRESSION_THRESHOLD)
+        self.assertEqual(user_data.decode(encoded), data)
+
+    def test_custom_threshold(self):
+        data = {'node': '/obj/geo1/null1', 'input': 0}
+        encoded = user_data.encode(data, threshold=0)
+        self.assertEqual(encoded[len(user_data.PREFIX_V2)],
+                         user_data.FLAG_ZLIB)
+        self.assertEqual(user_data.decode(encoded), data)
+
+    def test_unicode(self):
+        data = {'node': u'/obj/g\xe9o1/null1'}
+        for threshold in (0, user_data.COMPRESSION_THRESHOLD):
+            self.assertEqual(
+                user_data.decode(user_data.encode(data, threshold)), data)
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, user_data.decode, 'sgtk-03:j[]')
+        self.assertRaises(ValueError, user_data.decode, 'sgtk-02:q[]')
+
+
+if __name__ == '__main__':
+    unittest.main()
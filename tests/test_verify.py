@@ -0,0 +1,86 @@
+# Copyright (c) 2015 Pixomondo
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the MIT License included in this
+# distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the MIT License. All rights
+# not expressly granted therein are reserved by Pixomondo.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import support  # noqa: F401
+
+from tk_houdini_geometrynode import verify
+
+
+def sc_header(chunk_size):
+    return verify.SC_HEADER.pack(2, 1, 1, 1, chunk_size, chunk_size,
+                                 chunk_size)
+
+
+class TestCheckFrame(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check(self, name, data, min_size=None):
+        path = os.path.join(self.directory, name)
+        if data is not None:
+            with open(path, 'wb') as frame_file:
+                frame_file.write(data)
+        return verify.check_frame(1, path, min_size)['status']
+
+    def test_statuses(self):
+        self.assertEqual(self.check('a.bgeo', None), verify.STATUS_MISSING)
+        self.assertEqual(self.check('a.bgeo', b''), verify.STATUS_EMPTY)
+        self.assertEqual(self.check('a.bgeo', b'Bgeo' + b'\0' * 60),
+                         verify.STATUS_OK)
+        self.assertEqual(self.check('a.bgeo', b'garbage'),
+                         verify.STATUS_BAD_HEADER)
+        self.assertEqual(self.check('a.bgeo.gz', b'\x1f\x8b\0\0'),
+                         verify.STATUS_OK)
+        self.assertEqual(self.check('a.abc', b'anything'),
+                         verify.STATUS_UNCHECKED)
+
+    def test_sc(self):
+        self.assertEqual(self.check('a.bgeo.sc', sc_header(64) + b'\0' * 48),
+                         verify.STATUS_OK)
+        self.assertEqual(self.check('a.bgeo.sc', sc_header(64) + b'\0' * 8),
+                         verify.STATUS_TRUNCATED)
+        self.assertEqual(self.check('a.bgeo.sc', b'garbage' * 4),
+                         verify.STATUS_BAD_HEADER)
+
+    def test_min_size(self):
+        data = b'Bgeo' + b'\0' * 60
+        self.assertEqual(self.check('a.bgeo', data, 65),
+                         verify.STATUS_TRUNCATED)
+        self.assertEqual(self.check('a.bgeo', data, 64), verify.STATUS_OK)
+
+
+class TestMinimumSizes(unittest.TestCase):
+
+    def frames(self, sizes):
+        return [(frame, None, size, None)
+                for frame, size in enumerate(sizes, 1)]
+
+    def test_half_the_median_of_neighbours(self):
+        minimums = verify.minimum_sizes(self.frames([100, 100, 10, 100,
+                                                     100]))
+        self.assertEqual(minimums[3], 50)
+        self.assertTrue(all(minimums[f] <= 50 for f in minimums))
+
+    def test_needs_two_neighbours(self):
+        self.assertEqual(verify.minimum_sizes(self.frames([100])), {})
+        self.assertEqual(verify.minimum_sizes(self.frames([100, 0])), {})
+
+
+if __name__ == '__main__':
+    unittest.main()